@@ -0,0 +1,362 @@
+"""
+Static analysis of a rom: a disassembly, its control flow graph, subroutines and which bytes are code or data,
+all found without running it.
+
+ex. python -m chip8.analysis roms/INVADERS
+
+Code is found by following every path from the program start through jumps, calls, skips and returns,
+so bytes no path reaches are data. Bnnn jumps to an address only known at run time, paths through one
+end there and the jump is listed in indirect_jumps.
+
+Analyses are cached on disk keyed by the SHA-1 of the rom, so each rom is only analyzed once.
+"""
+import argparse
+import hashlib
+import json
+import os
+
+from chip8.chip8 import (
+    PROGRAM_START_LOCATION, decode, decode_extended, read_rom,
+    _0nnn, _00Cn, _00E0, _00EE, _00FB, _00FC, _00FD, _00FE, _00FF, _1nnn, _2nnn, _3xkk, _4xkk, _5xy0,
+    _6xkk, _7xkk, _8xy0, _8xy1, _8xy2, _8xy3, _8xy4, _8xy5, _8xy6, _8xy7, _8xyE, _9xy0, _Annn, _Bnnn,
+    _Cxkk, _Dxy0, _Dxyn, _Ex9E, _ExA1, _Fx07, _Fx0A, _Fx15, _Fx18, _Fx1E, _Fx29, _Fx30, _Fx33, _Fx55,
+    _Fx65, _Fx75, _Fx85
+)
+from chip8.quirks import get_quirks
+
+ANALYSIS_VERSION = 1 #bump when the analysis changes, cached analyses of older versions are redone
+MEMORY_SIZE = 4096
+
+#assembly of each handler, formatted with its operands named as in the handler's arguments
+MNEMONICS = {
+    _0nnn: 'SYS #{nnn:03X}',
+    _00E0: 'CLS',
+    _00EE: 'RET',
+    _1nnn: 'JP #{nnn:03X}',
+    _2nnn: 'CALL #{nnn:03X}',
+    _3xkk: 'SE V{x:X}, #{kk:02X}',
+    _4xkk: 'SNE V{x:X}, #{kk:02X}',
+    _5xy0: 'SE V{x:X}, V{y:X}',
+    _6xkk: 'LD V{x:X}, #{kk:02X}',
+    _7xkk: 'ADD V{x:X}, #{kk:02X}',
+    _8xy0: 'LD V{x:X}, V{y:X}',
+    _8xy1: 'OR V{x:X}, V{y:X}',
+    _8xy2: 'AND V{x:X}, V{y:X}',
+    _8xy3: 'XOR V{x:X}, V{y:X}',
+    _8xy4: 'ADD V{x:X}, V{y:X}',
+    _8xy5: 'SUB V{x:X}, V{y:X}',
+    _8xy6: 'SHR V{x:X}, V{y:X}',
+    _8xy7: 'SUBN V{x:X}, V{y:X}',
+    _8xyE: 'SHL V{x:X}, V{y:X}',
+    _9xy0: 'SNE V{x:X}, V{y:X}',
+    _Annn: 'LD I, #{nnn:03X}',
+    _Bnnn: 'JP V0, #{nnn:03X}',
+    _Cxkk: 'RND V{x:X}, #{kk:02X}',
+    _Dxyn: 'DRW V{x:X}, V{y:X}, {n}',
+    _Ex9E: 'SKP V{x:X}',
+    _ExA1: 'SKNP V{x:X}',
+    _Fx07: 'LD V{x:X}, DT',
+    _Fx0A: 'LD V{x:X}, K',
+    _Fx15: 'LD DT, V{x:X}',
+    _Fx18: 'LD ST, V{x:X}',
+    _Fx1E: 'ADD I, V{x:X}',
+    _Fx29: 'LD F, V{x:X}',
+    _Fx33: 'LD B, V{x:X}',
+    _Fx55: 'LD [I], V{x:X}',
+    _Fx65: 'LD V{x:X}, [I]',
+    _00Cn: 'SCD {n}',
+    _00FB: 'SCR',
+    _00FC: 'SCL',
+    _00FD: 'EXIT',
+    _00FE: 'LOW',
+    _00FF: 'HIGH',
+    _Dxy0: 'DRW V{x:X}, V{y:X}, 0',
+    _Fx30: 'LD HF, V{x:X}',
+    _Fx75: 'LD R, V{x:X}',
+    _Fx85: 'LD V{x:X}, R'
+}
+
+SKIPS = {_3xkk, _4xkk, _5xy0, _9xy0, _Ex9E, _ExA1}
+ENDS = {_00EE, _00FD, _Bnnn} #instructions with no successor known before run time
+
+def decode_opcode(opcode, extended=False):
+    """
+    (handler, operands) of opcode like chip8.decode, with SUPER-CHIP's instructions when extended
+    """
+    decoded = decode_extended(opcode) if extended else None
+    return decoded or decode(opcode)
+
+def disassemble(opcode, extended=False):
+    """
+    The assembly of opcode, ex. 'LD VA, #02', or 'DW #XXXX' when it is not an instruction
+    """
+    try:
+        handler, operands = decode_opcode(opcode, extended)
+    except KeyError:
+        return 'DW #%04X' % opcode
+    names = handler.__code__.co_varnames[1:1 + len(operands)]
+    return MNEMONICS[handler].format(**dict(zip(names, operands)))
+
+def successors(handler, operands, address):
+    """
+    Addresses execution can continue at after the instruction at address, calls continue after themselves
+    """
+    if handler in ENDS:
+        return []
+    if handler is _1nnn or handler is _0nnn:
+        return [operands[0]]
+    if handler in SKIPS:
+        return [address + 2, address + 4]
+    return [address + 2]
+
+class RomAnalysis(object):
+    """
+    What analyze finds in a rom, all addresses are in chip 8 memory.
+
+    instructions    {address: opcode} of every instruction reachable from the program start
+    blocks          {start: (end, successors)} basic blocks, end is the address after their last instruction
+    calls           addresses called by 2nnn, the entries of subroutines
+    subroutines     {entry: [block starts]} the blocks of each subroutine and the main program,
+                    following calls over rather than into them
+    data            [(start, end)] runs of the rom no path executes
+    references      addresses loaded into I by Annn, mostly sprites and other data
+    indirect_jumps  addresses of Bnnn instructions, whose targets depend on V0
+    """
+    def __init__(self, rom_data, extended, entry, instructions, blocks, calls, references, indirect_jumps):
+        self.rom_data = rom_data
+        self.sha1 = hashlib.sha1(rom_data).hexdigest()
+        self.extended = extended
+        self.entry = entry
+        self.size = len(rom_data)
+        self.instructions = instructions
+        self.blocks = blocks
+        self.calls = calls
+        self.references = references
+        self.indirect_jumps = indirect_jumps
+        self.subroutines = self.find_subroutines()
+        self.data = self.find_data()
+        self.routines = self.map_routines()
+
+    def find_subroutines(self):
+        subroutines = {}
+        for entry in [self.entry] + sorted(self.calls):
+            if entry not in self.blocks:
+                continue
+            seen = {entry}
+            pending = [entry]
+            while pending:
+                for successor in self.blocks[pending.pop()][1]:
+                    if successor in self.blocks and successor not in seen:
+                        seen.add(successor)
+                        pending.append(successor)
+            subroutines[entry] = sorted(seen)
+        return subroutines
+
+    def find_data(self):
+        code = bytearray(MEMORY_SIZE)
+        for address in self.instructions:
+            code[address:address + 2] = b'\x01\x01'
+        data = []
+        address, end = self.entry, self.entry + self.size
+        while address < end:
+            start = code.find(0, address, end)
+            if start == -1:
+                break
+            address = code.find(1, start, end)
+            if address == -1:
+                address = end
+            data.append((start, address))
+        return data
+
+    def map_routines(self):
+        """
+        {address: entry} of the routine each instruction is in, the main program's before any subroutine's
+        """
+        routines = {}
+        for entry, block_starts in self.subroutines.items():
+            for start in block_starts:
+                for address in range(start, self.blocks[start][0], 2):
+                    routines.setdefault(address, entry)
+        return routines
+
+    def routine_name(self, entry):
+        return 'main' if entry == self.entry else 'sub_%03X' % entry
+
+    def locate(self, address):
+        """
+        address relative to the routine it is in, ex. 'sub_2A0+0x04', or None outside the code found
+        """
+        entry = self.routines.get(address)
+        if entry is None:
+            return None
+        return '%s+0x%02X' % (self.routine_name(entry), address - entry)
+
+    def listing(self, data_bytes_per_line=8):
+        """
+        The rom as assembly lines, labelling routines, jump targets and the data loaded into I
+        """
+        data_starts = {start: end for start, end in self.data}
+        lines = []
+        address, end = self.entry, self.entry + self.size
+        while address < end:
+            if address in self.subroutines:
+                lines.append('')
+                lines.append('%s:' % self.routine_name(address))
+            elif address in self.blocks:
+                lines.append('L_%03X:' % address)
+            if address in self.instructions:
+                opcode = self.instructions[address]
+                lines.append('    %03X  %04X  %s' % (address, opcode, disassemble(opcode, self.extended)))
+                address += 2
+                continue
+            data_end = data_starts.get(address)
+            if data_end is None:
+                #second byte of an instruction only reached at an odd address
+                address += 1
+                continue
+            #a label at every address loaded into I, each starting a new line
+            labels = sorted(reference for reference in self.references if address < reference < data_end)
+            for run_start, run_end in zip([address] + labels, labels + [data_end]):
+                if run_start in self.references:
+                    lines.append('data_%03X:' % run_start)
+                for line_start in range(run_start, run_end, data_bytes_per_line):
+                    line_end = min(line_start + data_bytes_per_line, run_end)
+                    lines.append('    %03X  DB    %s' % (line_start, ' '.join(
+                        '#%02X' % byte for byte in self.rom_data[line_start - self.entry:line_end - self.entry]
+                    )))
+            address = data_end
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return {
+            'version': ANALYSIS_VERSION,
+            'sha1': self.sha1,
+            'extended': self.extended,
+            'entry': self.entry,
+            'instructions': sorted(self.instructions.items()),
+            'blocks': [[start, end, successors] for start, (end, successors) in sorted(self.blocks.items())],
+            'calls': sorted(self.calls),
+            'references': sorted(self.references),
+            'indirect_jumps': sorted(self.indirect_jumps)
+        }
+
+    @classmethod
+    def from_json(cls, data, rom_data):
+        """
+        The analysis to_json saved, rom_data is the rom it was made from, the json only holds its SHA-1
+        """
+        if data['sha1'] != hashlib.sha1(rom_data).hexdigest():
+            raise ValueError('Analysis of rom %s given rom %s' % (data['sha1'], hashlib.sha1(rom_data).hexdigest()))
+        return cls(
+            rom_data, data['extended'], data['entry'],
+            {address: opcode for address, opcode in data['instructions']},
+            {start: (end, successors) for start, end, successors in data['blocks']},
+            set(data['calls']), set(data['references']), set(data['indirect_jumps'])
+        )
+
+def analyze(rom_data, extended=False, entry=PROGRAM_START_LOCATION):
+    """
+    Finds the code, basic blocks and subroutines of rom_data loaded at entry
+    """
+    end = entry + len(rom_data)
+    instructions = {}
+    flow = {} #successors of each instruction
+    leaders = {entry} #addresses that start a basic block
+    calls = set()
+    references = set()
+    indirect_jumps = set()
+
+    pending = [entry]
+    while pending:
+        address = pending.pop()
+        if address in instructions or not entry <= address < end - 1:
+            continue
+        opcode = (rom_data[address - entry] << 8) | rom_data[address + 1 - entry]
+        try:
+            handler, operands = decode_opcode(opcode, extended)
+        except KeyError:
+            continue #not an instruction, the path was following data
+        instructions[address] = opcode
+        flow[address] = successors(handler, operands, address)
+        if handler is _2nnn:
+            calls.add(operands[0])
+            leaders.update((operands[0], address + 2))
+            pending.append(operands[0])
+        elif handler is _Annn:
+            references.add(operands[0])
+        elif handler is _Bnnn:
+            indirect_jumps.add(address)
+        if flow[address] != [address + 2]:
+            #control flow, every place it can go starts a block
+            leaders.update(flow[address])
+        pending.extend(flow[address])
+
+    blocks = {}
+    for start in leaders:
+        if start not in instructions:
+            continue
+        address = start
+        while True:
+            next_addresses = flow[address]
+            address += 2
+            if next_addresses != [address] or address in leaders or address not in instructions:
+                break
+        blocks[start] = (address, [successor for successor in next_addresses if successor in instructions])
+
+    return RomAnalysis(
+        bytes(rom_data), extended, entry, instructions, blocks, calls & set(instructions), references, indirect_jumps
+    )
+
+def default_cache_directory():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'chip8')
+
+def analyze_rom(rom_data, quirks=None, cache_directory=None):
+    """
+    The analysis of rom_data, from cache_directory when it was analyzed before, otherwise
+    analyzed and saved there. cache_directory defaults to ~/.cache/chip8, pass False to skip the cache.
+    """
+    extended = get_quirks(quirks).extended
+    sha1 = hashlib.sha1(rom_data).hexdigest()
+    if cache_directory is None:
+        cache_directory = default_cache_directory()
+    path = None
+    if cache_directory:
+        path = os.path.join(cache_directory, '%s%s.json' % (sha1, '-schip' if extended else ''))
+        try:
+            with open(path) as file:
+                data = json.load(file)
+            if data.get('version') == ANALYSIS_VERSION:
+                return RomAnalysis.from_json(data, bytes(rom_data))
+        except (OSError, ValueError, KeyError):
+            pass #missing or unreadable, analyze again
+
+    analysis = analyze(rom_data, extended)
+    if path is not None:
+        try:
+            os.makedirs(cache_directory, exist_ok=True)
+            temporary = '%s.%d.tmp' % (path, os.getpid())
+            with open(temporary, 'w') as file:
+                json.dump(analysis.to_json(), file)
+            os.replace(temporary, path) #whole or not at all, even with several processes writing
+        except OSError:
+            pass #the cache is only an optimization
+    return analysis
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Disassemble a chip 8 rom and list its routines and data')
+    parser.add_argument('rom')
+    parser.add_argument('--quirks', help='quirks profile the rom was written for, schip decodes SUPER-CHIP instructions')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='analyze the rom even if it was analyzed before')
+    args = parser.parse_args(argv)
+
+    analysis = analyze_rom(read_rom(args.rom), args.quirks, None if args.cache else False)
+    print('%s: %s, %d instructions in %d blocks, %d subroutines, %d of %d bytes data%s' % (
+        args.rom, analysis.sha1, len(analysis.instructions), len(analysis.blocks), len(analysis.calls),
+        sum(end - start for start, end in analysis.data), analysis.size,
+        ', indirect jumps at %s' % ' '.join('%03X' % address for address in sorted(analysis.indirect_jumps))
+        if analysis.indirect_jumps else ''
+    ))
+    print(analysis.listing())
+
+if __name__ == '__main__':
+    main()
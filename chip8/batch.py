@@ -0,0 +1,405 @@
+"""
+Runs many Chip8 machines in lockstep as NumPy arrays, for evaluating agents or fuzzing input at scale.
+
+ex.
+    batch = BatchChip8.from_rom('roms/PONG', 1000, seeds=range(1000))
+    for frame in range(600):
+        batch.set_keys(masks_for(frame))
+        batch.run_frame()
+
+Needs numpy, which nothing else in the emulator does.
+"""
+import numpy as np
+
+from chip8.chip8 import Chip8, FLAG_REGISTER, RANDOM_BLOCK_SIZE, SNAPSHOT_HEADER, random_block, read_rom
+from chip8.quirks import QUIRKS_PROFILES
+from chip8.scheduler import INSTRUCTIONS_PER_FRAME
+
+MEMORY_SIZE = 4096
+SPRITE_ROWS = np.arange(15)
+REGISTER_INDICES = np.arange(16)
+
+class BatchChip8(object):
+    """
+    N machines held as arrays: memory is (N, 4096), registers (N, 16), stack (N, 16), keys (N, 16),
+    display (N, 32) with a 64 bit row per int like Chip8's, and the program counter, I, timers and
+    stack pointer are vectors of N. pixels gives the display as (N, 32, 64).
+
+    Every step runs one instruction on every machine. Machines are grouped by opcode family and
+    each family is applied to its whole group with array operations, so every machine ends in
+    exactly the state Chip8 reaches running the same instructions, see snapshot.
+
+    Where Chip8 would raise, on an unknown opcode or an access past the end of memory, the stack
+    or the keys, the machine is marked in faulted instead and stays where it is from then on.
+
+    Only the default quirks are supported, with or without wrap_sprites.
+    """
+    def __init__(self, machines):
+        """
+        Starts the batch from the current state of each Chip8 in machines
+        """
+        for machine in machines:
+            if machine.quirks._replace(wrap_sprites=False) != QUIRKS_PROFILES['default']:
+                raise ValueError('%s: BatchChip8 only runs the default quirks, with or without wrap_sprites' % machine.rom_name)
+        count = len(machines)
+        self.rom_names = [machine.rom_name for machine in machines]
+        self.rom_data = [machine.rom_data for machine in machines]
+        self.wrap_sprites = np.array([machine.wrap_sprites for machine in machines], dtype=bool)
+
+        self.memory = np.zeros((count, MEMORY_SIZE), dtype=np.uint8)
+        self.registers = np.zeros((count, 16), dtype=np.uint8)
+        self.stack = np.zeros((count, 16), dtype=np.uint16)
+        self.keys = np.zeros((count, 16), dtype=np.uint8)
+        self.display = np.zeros((count, 32), dtype=np.uint64)
+        self.flag_registers = np.zeros((count, 16), dtype=np.uint8) #only carried between snapshots, nothing here uses them
+
+        self.program_counter = np.zeros(count, dtype=np.int64)
+        self.I = np.zeros(count, dtype=np.int64)
+        self.DT = np.zeros(count, dtype=np.int64)
+        self.ST = np.zeros(count, dtype=np.int64)
+        self.stack_pointer = np.zeros(count, dtype=np.int64)
+        self.draw_flag = np.zeros(count, dtype=bool)
+        self.faulted = np.zeros(count, dtype=bool)
+
+        self.seeds = [0] * count
+        self.random_block = np.zeros(count, dtype=np.int64)
+        self.random_index = np.zeros(count, dtype=np.int64)
+        self.random_bytes = np.zeros((count, RANDOM_BLOCK_SIZE), dtype=np.uint8)
+
+        self.frames = 0
+        self.families = (
+            self._0, self._1nnn, self._2nnn, self._3xkk, self._4xkk, self._5xy0, self._6xkk, self._7xkk,
+            self._8, self._9xy0, self._Annn, self._Bnnn, self._Cxkk, self._Dxyn, self._E, self._F
+        )
+
+        for index, machine in enumerate(machines):
+            self.load(index, machine.snapshot())
+
+    @classmethod
+    def from_rom(cls, rom_name, count, seeds=None, wrap_sprites=False):
+        """
+        count fresh machines running rom_name, seeds gives the random seed of each one
+        """
+        rom_data = read_rom(rom_name)
+        seeds = [None] * count if seeds is None else list(seeds)
+        if len(seeds) != count:
+            raise ValueError('Expected %d seeds, got %d' % (count, len(seeds)))
+        return cls([Chip8(rom_name, rom_data, wrap_sprites, seed) for seed in seeds])
+
+    def __len__(self):
+        return len(self.program_counter)
+
+    def load(self, index, snapshot):
+        """
+        Puts machine index in the state of a Chip8 snapshot
+        """
+        (pc, I, DT, ST, stack_pointer, draw_flag,
+         seed, block, random_index, hires) = SNAPSHOT_HEADER.unpack_from(snapshot)
+        if hires:
+            raise ValueError('BatchChip8 only runs the 64x32 display')
+        offset = SNAPSHOT_HEADER.size
+
+        def take(length):
+            nonlocal offset
+            offset += length
+            return np.frombuffer(snapshot, dtype=np.uint8, count=length, offset=offset - length)
+
+        self.registers[index] = take(16)
+        self.stack[index] = take(32).view(np.uint16)
+        self.memory[index] = take(MEMORY_SIZE)
+        self.display[index] = take(256).view('>u8')
+        self.keys[index] = take(16)
+        self.flag_registers[index] = take(16)
+
+        self.program_counter[index] = pc
+        self.I[index] = I
+        self.DT[index] = DT
+        self.ST[index] = ST
+        self.stack_pointer[index] = stack_pointer
+        self.draw_flag[index] = draw_flag
+        self.faulted[index] = False
+
+        self.seeds[index] = seed
+        self.random_block[index] = block
+        self.random_index[index] = random_index
+        self.random_bytes[index] = np.frombuffer(random_block(seed, block), dtype=np.uint8)
+
+    def snapshot(self, index):
+        """
+        Machine index as a Chip8 snapshot, byte for byte what Chip8.snapshot gives in the same state
+        """
+        header = SNAPSHOT_HEADER.pack(
+            int(self.program_counter[index]), int(self.I[index]), int(self.DT[index]), int(self.ST[index]),
+            int(self.stack_pointer[index]), bool(self.draw_flag[index]),
+            self.seeds[index], int(self.random_block[index]), int(self.random_index[index]), False
+        )
+        return b''.join((
+            header, self.registers[index].tobytes(), self.stack[index].tobytes(), self.memory[index].tobytes(),
+            self.display[index].astype('>u8').tobytes(), self.keys[index].tobytes(), self.flag_registers[index].tobytes()
+        ))
+
+    def machine(self, index):
+        """
+        A Chip8 in the state of machine index
+        """
+        chip8 = Chip8(self.rom_names[index], self.rom_data[index], bool(self.wrap_sprites[index]), self.seeds[index])
+        chip8.restore(self.snapshot(index))
+        return chip8
+
+    def pixels(self):
+        """
+        The display of every machine as an (N, 32, 64) array of 0 and 1
+        """
+        return np.unpackbits(self.display.astype('>u8').view(np.uint8), axis=1).reshape(-1, 32, 64)
+
+    def set_keys(self, key_masks):
+        """
+        Presses the keys set in each machine's 16 bit mask, and releases the rest
+        """
+        key_masks = np.asarray(key_masks, dtype=np.int64).reshape(-1, 1)
+        self.keys[:] = (key_masks >> REGISTER_INDICES) & 1
+
+    def update_timers(self):
+        self.DT -= self.DT > 0
+        self.ST -= self.ST > 0
+
+    def run(self, cycles):
+        for _ in range(cycles):
+            self.step()
+        return cycles
+
+    def run_frame(self, instructions_per_frame=INSTRUCTIONS_PER_FRAME):
+        self.run(instructions_per_frame)
+        self.update_timers()
+        self.frames += 1
+
+    def step(self):
+        """
+        Runs one instruction on every machine that hasn't faulted
+        """
+        machines = np.flatnonzero(~self.faulted)
+        pc = self.program_counter[machines]
+        fetchable = pc + 1 < MEMORY_SIZE
+        if not fetchable.all():
+            self.fault(machines, ~fetchable)
+            machines = machines[fetchable]
+            pc = pc[fetchable]
+        opcodes = (self.memory[machines, pc].astype(np.int64) << 8) | self.memory[machines, pc + 1]
+
+        families = opcodes >> 12
+        order = np.argsort(families, kind='stable')
+        start = 0
+        for family, end in enumerate(np.cumsum(np.bincount(families, minlength=16))):
+            if end > start:
+                group = order[start:end]
+                self.families[family](machines[group], opcodes[group])
+            start = end
+
+    def fault(self, machines, bad):
+        """
+        Marks machines[bad] as faulted, returns the mask of the machines left to run
+        """
+        self.faulted[machines[bad]] = True
+        return ~bad
+
+    #INSTRUCTIONS, each runs one family of opcodes on the machines given, see the handlers in chip8.py
+    def _0(self, machines, opcodes):
+        clear = opcodes == 0x00E0
+        self.display[machines[clear]] = 0
+        self.program_counter[machines[clear]] += 2
+
+        returns = opcodes == 0x00EE
+        if returns.any():
+            returning = machines[returns]
+            ok = self.fault(returning, self.stack_pointer[returning] == 0)
+            returning = returning[ok]
+            self.stack_pointer[returning] -= 1
+            self.program_counter[returning] = self.stack[returning, self.stack_pointer[returning]].astype(np.int64) + 2
+
+        jumps = ~(clear | returns)
+        self.program_counter[machines[jumps]] = opcodes[jumps] & 0x0FFF
+
+    def _1nnn(self, machines, opcodes):
+        self.program_counter[machines] = opcodes & 0x0FFF
+
+    def _2nnn(self, machines, opcodes):
+        ok = self.fault(machines, self.stack_pointer[machines] >= 16)
+        machines = machines[ok]
+        self.stack[machines, self.stack_pointer[machines]] = self.program_counter[machines]
+        self.stack_pointer[machines] += 1
+        self.program_counter[machines] = opcodes[ok] & 0x0FFF
+
+    def _3xkk(self, machines, opcodes):
+        equal = self.registers[machines, (opcodes >> 8) & 0xF] == (opcodes & 0xFF)
+        self.program_counter[machines] += np.where(equal, 4, 2)
+
+    def _4xkk(self, machines, opcodes):
+        equal = self.registers[machines, (opcodes >> 8) & 0xF] == (opcodes & 0xFF)
+        self.program_counter[machines] += np.where(equal, 2, 4)
+
+    def _5xy0(self, machines, opcodes):
+        equal = self.registers[machines, (opcodes >> 8) & 0xF] == self.registers[machines, (opcodes >> 4) & 0xF]
+        self.program_counter[machines] += np.where(equal, 4, 2)
+
+    def _6xkk(self, machines, opcodes):
+        self.registers[machines, (opcodes >> 8) & 0xF] = opcodes & 0xFF
+        self.program_counter[machines] += 2
+
+    def _7xkk(self, machines, opcodes):
+        x = (opcodes >> 8) & 0xF
+        self.registers[machines, x] = (self.registers[machines, x] + (opcodes & 0xFF)) & 0xFF
+        self.program_counter[machines] += 2
+
+    def _8(self, machines, opcodes):
+        n = opcodes & 0xF
+        ok = self.fault(machines, ((n > 7) & (n != 0xE)))
+        machines, opcodes, n = machines[ok], opcodes[ok], n[ok]
+        x = (opcodes >> 8) & 0xF
+        Vx = self.registers[machines, x].astype(np.int64)
+        Vy = self.registers[machines, (opcodes >> 4) & 0xF].astype(np.int64)
+
+        registers_sum = Vx + Vy
+        result = np.select(
+            [n == 0x0, n == 0x1, n == 0x2, n == 0x3, n == 0x4, n == 0x5, n == 0x6, n == 0x7],
+            [Vy, Vx | Vy, Vx & Vy, Vx ^ Vy, registers_sum, Vx - Vy, Vx >> 1, Vy - Vx],
+            Vx << 1
+        ) & 0xFF
+        #_8xy5, _8xy6, _8xy7 and _8xyE set VF before Vx, _8xy4 sets it after and only on a carry
+        flag_first = (n >= 0x5) & (n <= 0x7) | (n == 0xE)
+        flag = np.select([n == 0x5, n == 0x6, n == 0x7], [Vx > Vy, Vx & 1, Vy > Vx], Vx >> 7)
+        self.registers[machines[flag_first], FLAG_REGISTER] = flag[flag_first]
+        self.registers[machines, x] = result
+        self.registers[machines[(n == 0x4) & (registers_sum > 255)], FLAG_REGISTER] = 1
+        self.program_counter[machines] += 2
+
+    def _9xy0(self, machines, opcodes):
+        equal = self.registers[machines, (opcodes >> 8) & 0xF] == self.registers[machines, (opcodes >> 4) & 0xF]
+        self.program_counter[machines] += np.where(equal, 2, 4)
+
+    def _Annn(self, machines, opcodes):
+        self.I[machines] = opcodes & 0x0FFF
+        self.program_counter[machines] += 2
+
+    def _Bnnn(self, machines, opcodes):
+        self.program_counter[machines] = (opcodes & 0x0FFF) + self.registers[machines, 0]
+
+    def _Cxkk(self, machines, opcodes):
+        index = self.random_index[machines]
+        for machine in machines[index == RANDOM_BLOCK_SIZE]:
+            self.random_block[machine] += 1
+            block = random_block(self.seeds[machine], int(self.random_block[machine]))
+            self.random_bytes[machine] = np.frombuffer(block, dtype=np.uint8)
+        index[index == RANDOM_BLOCK_SIZE] = 0
+        self.registers[machines, (opcodes >> 8) & 0xF] = self.random_bytes[machines, index] & (opcodes & 0xFF)
+        self.random_index[machines] = index + 1
+        self.program_counter[machines] += 2
+
+    def _Dxyn(self, machines, opcodes):
+        n = opcodes & 0xF
+        wrap = self.wrap_sprites[machines]
+        Vx = self.registers[machines, (opcodes >> 8) & 0xF].astype(np.int64)
+        Vy = self.registers[machines, (opcodes >> 4) & 0xF].astype(np.int64)
+
+        rows = Vy[:, None] + SPRITE_ROWS
+        row_drawn = (SPRITE_ROWS < n[:, None]) & (wrap[:, None] | (rows < 32))
+        addresses = self.I[machines, None] + SPRITE_ROWS
+        ok = self.fault(machines, (row_drawn & (addresses >= MEMORY_SIZE)).any(axis=1))
+        if not ok.all():
+            machines, wrap, Vx, rows, row_drawn, addresses = (
+                machines[ok], wrap[ok], Vx[ok], rows[ok], row_drawn[ok], addresses[ok]
+            )
+
+        #only the rows actually drawn, so no display row is written twice for one machine
+        sprite_index, sprite_row = np.nonzero(row_drawn)
+        row_machines = machines[sprite_index]
+        display_rows = rows[sprite_index, sprite_row] % 32
+        sprite = self.memory[row_machines, addresses[sprite_index, sprite_row]].astype(np.uint64)
+
+        row_wrap = wrap[sprite_index]
+        Vx = Vx[sprite_index]
+        #clipped: shift the byte to column Vx, bits past column 63 fall off the right
+        shift = 56 - Vx
+        clipped = np.where(
+            shift >= 0,
+            sprite << np.maximum(shift, 0).astype(np.uint64),
+            sprite >> np.minimum(-shift, 8).astype(np.uint64)
+        )
+        #wrapped: rotate the byte from the top of the row right by Vx % 64
+        Vx %= 64
+        top = sprite << np.uint64(56)
+        rotated = np.where(
+            Vx == 0,
+            top,
+            (top >> Vx.astype(np.uint64)) | (top << ((64 - Vx) % 64).astype(np.uint64))
+        )
+        sprite = np.where(row_wrap, rotated, clipped)
+
+        display = self.display[row_machines, display_rows]
+        self.display[row_machines, display_rows] = display ^ sprite
+
+        collision = np.bincount(sprite_index, weights=(display & sprite) != 0, minlength=len(machines)) > 0
+        self.registers[machines, FLAG_REGISTER] = collision
+        self.program_counter[machines] += 2
+        self.draw_flag[machines] = True
+
+    def _E(self, machines, opcodes):
+        kk = opcodes & 0xFF
+        Vx = self.registers[machines, (opcodes >> 8) & 0xF]
+        ok = self.fault(machines, ((kk != 0x9E) & (kk != 0xA1)) | (Vx > 15))
+        machines, kk, Vx = machines[ok], kk[ok], Vx[ok]
+        pressed = self.keys[machines, Vx]
+        skip = np.where(kk == 0x9E, pressed == 1, pressed == 0)
+        self.program_counter[machines] += np.where(skip, 4, 2)
+
+    def _F(self, machines, opcodes):
+        kk = opcodes & 0xFF
+        x = (opcodes >> 8) & 0xF
+        I = self.I[machines]
+        known = np.isin(kk, (0x07, 0x0A, 0x15, 0x18, 0x1E, 0x29, 0x33, 0x55, 0x65))
+        past_end = np.where(kk == 0x33, I + 2, I + x) >= MEMORY_SIZE
+        ok = self.fault(machines, ~known | (np.isin(kk, (0x33, 0x55, 0x65)) & past_end))
+        machines, kk, x, I = machines[ok], kk[ok], x[ok], I[ok]
+        Vx = self.registers[machines, x].astype(np.int64)
+
+        op = kk == 0x07
+        self.registers[machines[op], x[op]] = self.DT[machines[op]]
+        op = kk == 0x15
+        self.DT[machines[op]] = Vx[op]
+        op = kk == 0x18
+        self.ST[machines[op]] = Vx[op]
+        op = kk == 0x1E
+        self.I[machines[op]] += Vx[op]
+        op = kk == 0x29
+        self.I[machines[op]] = Vx[op] * 5
+
+        op = kk == 0x33
+        if op.any():
+            bcd = machines[op]
+            self.memory[bcd, I[op]] = Vx[op] // 100
+            self.memory[bcd, I[op] + 1] = (Vx[op] % 100) // 10
+            self.memory[bcd, I[op] + 2] = Vx[op] % 10
+
+        for load, kk_value in ((False, 0x55), (True, 0x65)):
+            op = kk == kk_value
+            if not op.any():
+                continue
+            copying = REGISTER_INDICES <= x[op, None]
+            copy_machines = np.broadcast_to(machines[op, None], copying.shape)[copying]
+            copy_registers = np.broadcast_to(REGISTER_INDICES, copying.shape)[copying]
+            copy_addresses = (I[op, None] + REGISTER_INDICES)[copying]
+            if load:
+                self.registers[copy_machines, copy_registers] = self.memory[copy_machines, copy_addresses]
+            else:
+                self.memory[copy_machines, copy_addresses] = self.registers[copy_machines, copy_registers]
+            self.I[machines[op]] += x[op] + 1
+
+        #_Fx0A waits on the same instruction until a key is down, then takes the lowest one
+        advance = kk != 0x0A
+        op = ~advance
+        if op.any():
+            pressed = self.keys[machines[op]] == 1
+            key_down = pressed.any(axis=1)
+            waiting = machines[op][key_down]
+            self.registers[waiting, x[op][key_down]] = pressed.argmax(axis=1)[key_down]
+            advance[np.flatnonzero(op)[key_down]] = True
+        self.program_counter[machines[advance]] += 2
@@ -0,0 +1,109 @@
+"""
+Benchmarks every rom in a directory on every engine and prints the results as JSON.
+
+ex. python -m chip8.bench --cycles 200000 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from chip8.chip8 import Chip8
+from chip8.engines import ENGINES
+from chip8.headless import demo_input, run_headless, set_keys
+from chip8.scheduler import INSTRUCTIONS_PER_FRAME
+
+def time_opcode_families(rom_name, cycles, input_script, seed):
+    """
+    Runs rom_name on the interpreter timing every instruction,
+    returns the count and total seconds per opcode family (first nibble of the opcode).
+
+    Timing each instruction slows the run down several times,
+    so these numbers are only meaningful relative to each other.
+    """
+    chip8 = Chip8(rom_name, seed=seed)
+    perf_counter = time.perf_counter
+    counts = [0] * 16
+    seconds = [0.0] * 16
+
+    frame = 0
+    while cycles > 0:
+        set_keys(chip8, input_script(frame))
+        for _ in range(min(cycles, INSTRUCTIONS_PER_FRAME)):
+            address = chip8.program_counter
+            instruction = chip8.decode_cache[address]
+            if instruction is None:
+                instruction = chip8.decode_instruction(address)
+            family = chip8.memory[address] >> 4
+            start = perf_counter()
+            instruction()
+            seconds[family] += perf_counter() - start
+            counts[family] += 1
+        if cycles >= INSTRUCTIONS_PER_FRAME:
+            chip8.update_timers()
+        cycles -= INSTRUCTIONS_PER_FRAME
+        frame += 1
+
+    return {
+        '0x%X' % family: {'count': counts[family], 'seconds': seconds[family]}
+        for family in range(16) if counts[family]
+    }
+
+def benchmark_rom(rom_name, cycles, engines, input_script=demo_input, seed=0):
+    """
+    Runs rom_name on each engine with the same input and seed,
+    so every engine must end in the same state
+    """
+    result = {'rom': os.path.basename(rom_name), 'cycles': cycles, 'engines': {}}
+    for engine in engines:
+        try:
+            run = run_headless(rom_name, cycles, engine, input_script, seed, skip_idle=False)
+        except Exception as error:
+            result['engines'][engine] = {'error': '%s: %s' % (type(error).__name__, error)}
+            continue
+        result['engines'][engine] = {
+            'seconds': run['seconds'],
+            'instructions_per_second': run['cycles_per_second'],
+            'frames_per_second': run['frames'] / run['seconds'] if run['seconds'] > 0 else float('inf'),
+            'hashes': run['hashes']
+        }
+    try:
+        result['opcode_families'] = time_opcode_families(rom_name, cycles, input_script, seed)
+    except Exception as error:
+        result['opcode_families'] = {'error': '%s: %s' % (type(error).__name__, error)}
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the chip 8 engines over a directory of roms')
+    parser.add_argument('--roms', default='roms', help='directory of roms to run, every file in it is benchmarked')
+    parser.add_argument('--cycles', type=int, default=100000, help='instructions to run each rom for')
+    parser.add_argument('--engines', default=','.join(sorted(ENGINES)),
+                        help='comma separated engines to compare, default all of them')
+    parser.add_argument('--output', help='file to write the JSON results to instead of stdout')
+    args = parser.parse_args(argv)
+
+    engines = args.engines.split(',')
+    for engine in engines:
+        if engine not in ENGINES:
+            parser.error('unknown engine %r, expected one of %s' % (engine, ', '.join(sorted(ENGINES))))
+
+    results = {
+        'python': platform.python_version(),
+        'instructions_per_frame': INSTRUCTIONS_PER_FRAME,
+        'roms': [
+            benchmark_rom(os.path.join(args.roms, rom), args.cycles, engines)
+            for rom in sorted(os.listdir(args.roms))
+        ]
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+if __name__ == '__main__':
+    main()
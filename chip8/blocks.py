@@ -0,0 +1,192 @@
+from chip8.chip8 import (
+    _0nnn, _00EE, _1nnn, _2nnn, _3xkk, _4xkk, _5xy0, _6xkk, _7xkk,
+    _8xy0, _8xy1, _8xy2, _8xy3, _8xy4, _9xy0, _Annn, _Bnnn, _Dxyn,
+    _Ex9E, _ExA1, _Fx07, _Fx0A, _Fx15, _Fx18, _Fx1E, _Fx29, _Fx33, _Fx55,
+    _Bxnn, _Dxyn_wrap, _Fx55_increment_x, _Fx55_keep_i,
+    _00Cn, _00FB, _00FC, _00FD, _00FE, _00FF, _Dxy0,
+    FLAG_REGISTER
+)
+
+MAX_BLOCK_LENGTH = 32 #instructions per block, keeps recompiling after invalidation cheap
+
+#instructions that change the program counter in a way only known at run time,
+#draw to the screen or write to memory. A block always ends after one of these.
+BLOCK_TERMINATORS = {
+    _0nnn, _00EE, _1nnn, _2nnn, _3xkk, _4xkk, _5xy0, _9xy0, _Bnnn,
+    _Dxyn, _Ex9E, _ExA1, _Fx0A, _Fx33, _Fx55,
+    _Bxnn, _Dxyn_wrap, _Fx55_increment_x, _Fx55_keep_i,
+    _00Cn, _00FB, _00FC, _00FD, _00FE, _00FF, _Dxy0
+}
+
+#python source for instructions simple enough to inline, everything else calls its handler.
+#Each template gets the instruction's address followed by its operands.
+INLINE_TEMPLATES = {
+    _00EE: lambda a: [
+        "if c.stack_pointer == 0: raise IndexError('RET with an empty stack')",
+        'c.stack_pointer -= 1',
+        'c.program_counter = c.stack[c.stack_pointer] + 2'
+    ],
+    _1nnn: lambda a, nnn: ['c.program_counter = %d' % nnn],
+    _2nnn: lambda a, nnn: [
+        'c.stack[c.stack_pointer] = %d' % a,
+        'c.stack_pointer += 1',
+        'c.program_counter = %d' % nnn
+    ],
+    _3xkk: lambda a, x, kk: ['c.program_counter = %d if r[%d] == %d else %d' % (a + 4, x, kk, a + 2)],
+    _4xkk: lambda a, x, kk: ['c.program_counter = %d if r[%d] != %d else %d' % (a + 4, x, kk, a + 2)],
+    _5xy0: lambda a, x, y: ['c.program_counter = %d if r[%d] == r[%d] else %d' % (a + 4, x, y, a + 2)],
+    _6xkk: lambda a, x, kk: ['r[%d] = %d' % (x, kk)],
+    _7xkk: lambda a, x, kk: ['r[%d] = (r[%d] + %d) & 0xFF' % (x, x, kk)],
+    _8xy0: lambda a, x, y: ['r[%d] = r[%d]' % (x, y)],
+    _8xy1: lambda a, x, y: ['r[%d] = r[%d] | r[%d]' % (x, x, y)],
+    _8xy2: lambda a, x, y: ['r[%d] = r[%d] & r[%d]' % (x, x, y)],
+    _8xy3: lambda a, x, y: ['r[%d] = r[%d] ^ r[%d]' % (x, x, y)],
+    _8xy4: lambda a, x, y: [
+        's = r[%d] + r[%d]' % (x, y),
+        'r[%d] = s & 0xFF' % x,
+        'if s > 255: r[%d] = 1' % FLAG_REGISTER
+    ],
+    _9xy0: lambda a, x, y: ['c.program_counter = %d if r[%d] != r[%d] else %d' % (a + 4, x, y, a + 2)],
+    _Annn: lambda a, nnn: ['c.I = %d' % nnn],
+    _Ex9E: lambda a, x: ['c.program_counter = %d if c.keys[r[%d]] == 1 else %d' % (a + 4, x, a + 2)],
+    _ExA1: lambda a, x: ['c.program_counter = %d if c.keys[r[%d]] == 0 else %d' % (a + 4, x, a + 2)],
+    _Fx07: lambda a, x: ['r[%d] = c.DT' % x],
+    _Fx15: lambda a, x: ['c.DT = r[%d]' % x],
+    _Fx18: lambda a, x: ['c.ST = r[%d]' % x],
+    _Fx1E: lambda a, x: ['c.I += r[%d]' % x],
+    _Fx29: lambda a, x: ['c.I = (r[%d] * 5)' % x],
+}
+
+class BlockEngine(object):
+    """
+    Runs a Chip8 a basic block at a time instead of one opcode at a time.
+
+    A block is a straight-line run of instructions ending at a jump, skip, call, return,
+    draw or memory write. Each block is compiled once into a single python function with
+    the simple instructions inlined, and leaves registers, memory and display
+    exactly as running its instructions through perform_cycle would.
+    """
+    def __init__(self, chip8):
+        self.chip8 = chip8
+        self.blocks = [None] * 4096 #(length, function) of the block starting at each address
+        self.code_map = bytearray(4096) #1 for every byte read by a compiled block
+        chip8.code_listeners.append(self.invalidate)
+
+    def run(self, cycles):
+        """
+        Executes exactly cycles instructions, falling back to perform_cycle when the next
+        block is longer than what is left.
+        """
+        chip8 = self.chip8
+        blocks = self.blocks
+        remaining = cycles
+        while remaining > 0:
+            block = blocks[chip8.program_counter]
+            if block is None:
+                block = self.compile_block(chip8.program_counter)
+            length, function = block
+            if length > remaining:
+                for _ in range(remaining):
+                    chip8.perform_cycle()
+                break
+            function(chip8)
+            remaining -= length
+        return cycles
+
+    def step(self):
+        """
+        Executes the block at the program counter, returns how many instructions it ran
+        """
+        chip8 = self.chip8
+        block = self.blocks[chip8.program_counter]
+        if block is None:
+            block = self.compile_block(chip8.program_counter)
+        block[1](chip8)
+        return block[0]
+
+    def precompile(self, addresses):
+        """
+        Compiles the blocks starting at addresses ahead of time, ex. the blocks of a RomAnalysis,
+        so the first frames don't pay for compiling them. Addresses that aren't code are left alone.
+        """
+        for address in addresses:
+            if self.blocks[address] is None:
+                try:
+                    self.compile_block(address)
+                except KeyError:
+                    pass
+
+    def invalidate(self, start, end):
+        if self.code_map.find(1, start, end) == -1:
+            return
+        for address in range(max(start - 2 * MAX_BLOCK_LENGTH, 0), end):
+            block = self.blocks[address]
+            if block is not None and address + 2 * block[0] > start:
+                self.blocks[address] = None
+        self.code_map[start:end] = bytes(end - start)
+
+    def compile_block(self, address):
+        instructions = self.find_block(address)
+        function = self.translate(address, instructions)
+        block = (len(instructions), function)
+        self.blocks[address] = block
+        end = address + 2 * len(instructions)
+        self.code_map[address:end] = b'\x01' * (end - address)
+        return block
+
+    def find_block(self, address):
+        """
+        Decodes instructions from address up to and including the first block terminator
+        """
+        chip8 = self.chip8
+        instructions = []
+        while len(instructions) < MAX_BLOCK_LENGTH and address + 1 < len(chip8.memory):
+            instruction = chip8.decode_cache[address]
+            if instruction is None:
+                try:
+                    instruction = chip8.decode_instruction(address)
+                except KeyError:
+                    #not an opcode, most likely data following the code
+                    if not instructions:
+                        raise
+                    break
+            instructions.append(instruction)
+            if instruction.func in BLOCK_TERMINATORS:
+                break
+            address += 2
+        return instructions
+
+    def translate(self, address, instructions):
+        """
+        Generates the source for one block and compiles it into a function of the chip8
+        """
+        lines = ['r = c.registers']
+        handlers = []
+        program_counter = address
+        synced = True #whether c.program_counter already holds program_counter
+        for instruction in instructions:
+            handler = instruction.func
+            operands = instruction.args[1:]
+            if handler in INLINE_TEMPLATES:
+                lines.extend(INLINE_TEMPLATES[handler](program_counter, *operands))
+                synced = handler in BLOCK_TERMINATORS
+            else:
+                if not synced:
+                    lines.append('c.program_counter = %d' % program_counter)
+                name = 'h%d' % len(handlers)
+                handlers.append(handler)
+                lines.append('%s(%s)' % (name, ', '.join(['c'] + [str(operand) for operand in operands])))
+                synced = True
+            program_counter += 2
+
+        if handler not in BLOCK_TERMINATORS:
+            lines.append('c.program_counter = %d' % program_counter)
+
+        names = ['h%d' % i for i in range(len(handlers))]
+        source = 'def make(%s):\n    def block(c):\n%s\n    return block\n' % (
+            ', '.join(names),
+            '\n'.join('        ' + line for line in lines)
+        )
+        namespace = {}
+        exec(compile(source, '<chip8 block 0x%03X>' % address, 'exec'), namespace)
+        return namespace['make'](*handlers)
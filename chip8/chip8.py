@@ -1,5 +1,13 @@
+import hashlib
+import mmap
+import os
 import random
+import struct
 import time
+from array import array
+from functools import partial
+
+from chip8.quirks import get_quirks
 
 #CONSTANTS
 FONTS = [ 
@@ -20,22 +28,150 @@ FONTS = [
     0xF0, 0x80, 0xF0, 0x80, 0xF0, # E
     0xF0, 0x80, 0xF0, 0x80, 0x80  # F
 ]
+#SUPER-CHIP 8x10 digits for Fx30, stored right after FONTS
+BIG_FONTS = [
+    0xFF, 0xFF, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, # 0
+    0x18, 0x78, 0x78, 0x18, 0x18, 0x18, 0x18, 0x18, 0xFF, 0xFF, # 1
+    0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, # 2
+    0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, # 3
+    0xC3, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0x03, 0x03, 0x03, 0x03, # 4
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, # 5
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, # 6
+    0xFF, 0xFF, 0x03, 0x03, 0x06, 0x0C, 0x18, 0x18, 0x18, 0x18, # 7
+    0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, # 8
+    0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, # 9
+    0x7E, 0xFF, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xC3, # A
+    0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC, # B
+    0x3C, 0xFF, 0xC3, 0xC0, 0xC0, 0xC0, 0xC0, 0xC3, 0xFF, 0x3C, # C
+    0xFC, 0xFE, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFE, 0xFC, # D
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, # E
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xC0, 0xC0  # F
+]
+BIG_FONTS_LOCATION = len(FONTS)
 FLAG_REGISTER  = 0xF
 PROGRAM_START_LOCATION = 0x200
+LORES_SIZE = (64, 32)
+HIRES_SIZE = (128, 64) #SUPER-CHIP high resolution mode
+SEED_MASK = (1 << 64) - 1
+RANDOM_BLOCK_SIZE = 4096 #random bytes generated at a time for _Cxkk
+RANDOM_BLOCK_KEY = struct.Struct('<QI') #seed, block number
+
+#PC, I, DT, ST, stack pointer, draw flag, random stream position and high resolution flag at the start
+#of a snapshot, followed by the registers, stack, memory, display, keys and SUPER-CHIP flag registers
+SNAPSHOT_HEADER = struct.Struct('<HIBBB?QIH?')
+
+def read_rom(path):
+    """
+    The contents of the rom file at path, mapped rather than read through a file buffer
+    """
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as rom:
+            return rom[:]
+
+def random_block(seed, block):
+    """
+    The block-th RANDOM_BLOCK_SIZE bytes of the random stream for seed.
+
+    Each block is SHAKE-128 of the seed and block number, so any point of the stream
+    can be regenerated from (seed, block, index) alone, which is what snapshots store.
+    """
+    return hashlib.shake_128(RANDOM_BLOCK_KEY.pack(seed, block)).digest(RANDOM_BLOCK_SIZE)
+
+def install_hook(chip8, name, hook):
+    """
+    Puts hook in place of chip8's method name on the instance, on top of any hook already there.
+    Look up the method before installing, for hook to call through to.
+    """
+    hook.shadowed = chip8.__dict__.get(name)
+    hook.removed = False
+    setattr(chip8, name, hook)
+
+def remove_hook(chip8, name, hook):
+    """
+    Takes hook back out along with any removed hooks under it. While another hook is on top of it,
+    it stays in place and should call straight through.
+    """
+    hook.removed = True
+    if chip8.__dict__.get(name) is not hook:
+        return
+    shadowed = hook.shadowed
+    while shadowed is not None and getattr(shadowed, 'removed', False):
+        shadowed = shadowed.shadowed
+    if shadowed is None:
+        delattr(chip8, name)
+    else:
+        setattr(chip8, name, shadowed)
 
 class Chip8(object):
-    def __init__(self, rom_name):
+    def __init__(self, rom_name, rom_data=None, wrap_sprites=False, seed=None, quirks=None):
+        """
+        seed starts the random numbers of _Cxkk, machines with the same seed draw the same numbers.
+        Without one a seed is taken from the random module.
+
+        quirks is a Quirks or the name of a profile, see chip8.quirks, wrap_sprites turns on its wrap_sprites.
+        The quirks pick the handlers each opcode decodes to, so they cost nothing per instruction.
+        """
         self.rom_name = rom_name
+        self.rom_data = rom_data #contents of the rom, read from rom_name on the first load when not given
+        self.quirks = get_quirks(quirks)
+        if wrap_sprites:
+            self.quirks = self.quirks._replace(wrap_sprites=True)
+        self.wrap_sprites = self.quirks.wrap_sprites #wrap sprites drawn past the edge of the screen instead of clipping them
+        self.handlers = quirk_handlers(self.quirks) #handler to run in place of each standard one
+        self.code_listeners = [] #called with (start, end) whenever cached code is invalidated
+        self.seed_random(random.getrandbits(64) if seed is None else seed)
         self.initialize()
         self.load_rom()
 
+    def seed_random(self, seed, block=0, index=0):
+        """
+        Moves the random stream of _Cxkk to byte index of block of the stream for seed
+        """
+        self.seed = seed & SEED_MASK
+        self.random_block = block
+        self.random_bytes = random_block(self.seed, block)
+        self.random_index = index #next unused byte of random_bytes
+
+    def next_random_block(self):
+        self.seed_random(self.seed, self.random_block + 1)
+
     def perform_cycle(self):
-        opcode = (self.memory[self.program_counter] << 8) | self.memory[self.program_counter+1]
-        first_byte_of_opcode = (opcode & 0xf000) >> 12
-        instruction_map[first_byte_of_opcode](self, opcode)
-        self.update_timers()
+        instruction = self.decode_cache[self.program_counter]
+        if instruction is None:
+            instruction = self.decode_instruction(self.program_counter)
+        instruction()
+
+    def decode_instruction(self, address):
+        """
+        Decodes the opcode at address into a handler with its operands already bound,
+        and caches it so the next visit skips the fetch and decode.
+        """
+        opcode = (self.memory[address] << 8) | self.memory[address+1]
+        decoded = decode_extended(opcode) if self.quirks.extended else None
+        handler, operands = decoded or decode(opcode)
+        instruction = partial(self.handlers.get(handler, handler), self, *operands)
+        self.decode_cache[address] = instruction
+        return instruction
+
+    def invalidate_code(self, address, length):
+        """
+        Drops cached instructions overlapping memory[address:address+length].
+
+        Must be called after anything writes to memory so self-modifying ROMs
+        see their new opcodes.
+        """
+        start = max(address - 1, 0)
+        end = min(address + length, len(self.decode_cache))
+        self.decode_cache[start:end] = [None] * (end - start)
+        for listener in self.code_listeners:
+            listener(start, end)
     
     def update_timers(self):
+        """
+        Counts DT and ST down, called 60 times a second by the scheduler
+        """
         if self.DT > 0:
             self.DT -= 1
         if self.ST > 0:
@@ -43,54 +179,130 @@ class Chip8(object):
         
 
     def load_rom(self):
-        file = open(self.rom_name, 'rb').read()
-        i = 0
-        while i < len(file):
-            self.memory[i + PROGRAM_START_LOCATION] = file[i]
-            i += 1
+        if self.rom_data is None:
+            self.rom_data = read_rom(self.rom_name) #kept so reset never reads the file again
+        end = PROGRAM_START_LOCATION + len(self.rom_data)
+        if end > len(self.memory):
+            raise ValueError('%s is %d bytes, more than the %d that fit in memory' % (
+                self.rom_name, len(self.rom_data), len(self.memory) - PROGRAM_START_LOCATION
+            ))
+        self.memory[PROGRAM_START_LOCATION:end] = self.rom_data
 
     def initialize(self):
         self.program_counter = PROGRAM_START_LOCATION
-        self.memory = [0]*4096 #4kb of memory, 4096 bytes
-        self.registers = [0]*16 #general purpose registers, 8 bit. 1byte
+        self.memory = bytearray(4096) #4kb of memory, 4096 bytes
+        self.registers = bytearray(16) #general purpose registers, 8 bit. 1byte
 
         self.I = 0
         self.ST = 0
         self.DT = 0
 
-        self.stack_pointer = 0
-        self.stack = []
+        self.stack_pointer = 0 #number of addresses on the stack
+        self.stack = array('H', [0] * 16) #16 levels of 16 bit return addresses
 
         self.draw_flag = False #not actually a part of the chip, but helps with performance
-        self.display = [0] * 64 * 32 # monochrome 64 by 32 pixel display
+        self.set_resolution(False)
+
+        self.keys = bytearray(16)
+        self.flag_registers = bytearray(16) #SUPER-CHIP's RPL user flags, saved and loaded by Fx75 and Fx85
 
-        self.keys = [0] * 16
+        self.decode_cache = [None] * 4096 #decoded instruction per address, see decode_instruction
 
         self.load_fonts()
     
     def load_fonts(self):
         for i in range(80):
             self.memory[i] = FONTS[i]
-        
+        if self.quirks.extended:
+            self.memory[BIG_FONTS_LOCATION:BIG_FONTS_LOCATION + len(BIG_FONTS)] = bytes(BIG_FONTS)
+
+    def set_resolution(self, hires):
+        """
+        Switches between the 64x32 display and SUPER-CHIP's 128x64 one, clearing it
+        """
+        self.hires = hires
+        self.width, self.height = HIRES_SIZE if hires else LORES_SIZE
+        self.display = [0] * self.height # monochrome display, one width bit int per row with column 0 in the top bit
+        self.dirty_rows = (1 << self.height) - 1 #bit per display row changed since the display last presented it
+
+    def pixel(self, col, row):
+        return (self.display[row] >> (self.width - 1 - col)) & 1
+
+    def display_buffer(self):
+        """
+        The display packed into bytes, width / 8 per row with the leftmost pixel in the top bit
+        """
+        row_bytes = self.width // 8
+        return b''.join(row.to_bytes(row_bytes, 'big') for row in self.display)
+
+    def snapshot(self):
+        """
+        The whole machine state as one compact bytes blob, see restore
+        """
+        header = SNAPSHOT_HEADER.pack(
+            self.program_counter, self.I, self.DT, self.ST, self.stack_pointer, self.draw_flag,
+            self.seed, self.random_block, self.random_index, self.hires
+        )
+        return b''.join((
+            header, self.registers, self.stack.tobytes(), self.memory, self.display_buffer(), self.keys,
+            self.flag_registers
+        ))
+
+    def restore(self, snapshot):
+        """
+        Puts the machine back in the state snapshot was taken in
+        """
+        (self.program_counter, self.I, self.DT, self.ST, self.stack_pointer, self.draw_flag,
+         seed, block, index, hires) = SNAPSHOT_HEADER.unpack_from(snapshot)
+        if (seed, block) != (self.seed, self.random_block):
+            self.seed_random(seed, block, index)
+        self.random_index = index
+        offset = SNAPSHOT_HEADER.size
+
+        def take(length):
+            nonlocal offset
+            offset += length
+            return snapshot[offset - length:offset]
+
+        self.registers[:] = take(len(self.registers))
+        self.stack = array('H', take(2 * len(self.stack)))
+        self.memory[:] = take(len(self.memory))
+        self.set_resolution(hires)
+        row_bytes = self.width // 8
+        display = take(row_bytes * self.height)
+        self.display = [int.from_bytes(display[row:row + row_bytes], 'big') for row in range(0, len(display), row_bytes)]
+        self.keys[:] = take(len(self.keys))
+        self.flag_registers[:] = take(len(self.flag_registers))
+
+        self.invalidate_code(0, len(self.memory))
+
+    def fork(self):
+        """
+        A new machine in the same state as this one, that runs independently from here on
+        """
+        clone = Chip8(self.rom_name, self.rom_data, seed=self.seed, quirks=self.quirks)
+        clone.restore(self.snapshot())
+        return clone
 
     def reset(self):
         self.initialize()
         self.load_rom()
+        self.invalidate_code(0, len(self.memory))
 
 
 #INSTRUCTIONS
-def _0(chip8: Chip8, opcode): 
+def _0(opcode): 
     """
-    runs either _0nnn, _00E0, or _00EE
+    decodes to either _0nnn, _00E0, or _00EE
     """
     if opcode == 0x00E0:
-        _00E0(chip8)
+        return _00E0
     elif opcode == 0x00EE:
-        _00EE(chip8)
+        return _00EE
     else:
-        _0nnn(chip8, opcode)
+        return _0nnn
 
-def _0nnn(chip8: Chip8, opcode):
+def _0nnn(chip8: Chip8, nnn):
     """ 
     SYS addr
     
@@ -98,7 +310,7 @@ def _0nnn(chip8: Chip8, opcode):
 
     nnn = a 12 bit value/addr
     """
-    chip8.program_counter = get_nnn(opcode)
+    chip8.program_counter = nnn
 
 def _00E0(chip8: Chip8):
     """
@@ -106,7 +318,8 @@ def _00E0(chip8: Chip8):
 
     Clear the display
     """
-    chip8.display = [0] * 64 * 32
+    chip8.display = [0] * chip8.height
+    chip8.dirty_rows = (1 << chip8.height) - 1
     chip8.program_counter += 2
 
 def _00EE(chip8: Chip8):
@@ -118,11 +331,13 @@ def _00EE(chip8: Chip8):
     The interpreter sets the program counter to the address at the top of the stack,
     then subtracts 1 from the stack pointer
     """
-    chip8.program_counter = chip8.stack.pop()
+    if chip8.stack_pointer == 0:
+        raise IndexError('RET with an empty stack')
     chip8.stack_pointer -= 1
+    chip8.program_counter = chip8.stack[chip8.stack_pointer]
     chip8.program_counter += 2
 
-def _1nnn(chip8: Chip8, opcode):
+def _1nnn(chip8: Chip8, nnn):
     """
     JP addr
 
@@ -130,9 +345,9 @@ def _1nnn(chip8: Chip8, opcode):
 
     The interpreter sets the program counter to nnn
     """
-    chip8.program_counter = get_nnn(opcode)
+    chip8.program_counter = nnn
 
-def _2nnn(chip8: Chip8, opcode):
+def _2nnn(chip8: Chip8, nnn):
     """
     CALL addr
 
@@ -142,11 +357,11 @@ def _2nnn(chip8: Chip8, opcode):
     then puts the current PC on the top of the stack. 
     The PC is then set to nnn.
     """
+    chip8.stack[chip8.stack_pointer] = chip8.program_counter
     chip8.stack_pointer += 1
-    chip8.stack.append(chip8.program_counter)
-    chip8.program_counter = get_nnn(opcode)
+    chip8.program_counter = nnn
 
-def _3xkk(chip8: Chip8, opcode):
+def _3xkk(chip8: Chip8, x, kk):
     """
     SE Vx, byte
 
@@ -156,15 +371,12 @@ def _3xkk(chip8: Chip8, opcode):
     and if they are equal, 
     increments the program counter by 2.
     """
-    VX_value = chip8.registers[get_Vx(opcode)]
-    kk = get_kk(opcode)
-    
-    if chip8.registers[get_Vx(opcode)] == get_kk(opcode):
+    if chip8.registers[x] == kk:
         chip8.program_counter += 4
     else:
         chip8.program_counter += 2
 
-def _4xkk(chip8: Chip8, opcode):
+def _4xkk(chip8: Chip8, x, kk):
     """
     SNE Vx, byte
 
@@ -174,13 +386,12 @@ def _4xkk(chip8: Chip8, opcode):
     and if they are not equal, 
     increments the program counter by 2.
     """
-    if chip8.registers[get_Vx(opcode)] != get_kk(opcode):
+    if chip8.registers[x] != kk:
         chip8.program_counter += 4
     else:
         chip8.program_counter += 2
-    
 
-def _5xy0(chip8: Chip8, opcode):
+def _5xy0(chip8: Chip8, x, y):
     """
     SE Vx, Vy
 
@@ -190,12 +401,12 @@ def _5xy0(chip8: Chip8, opcode):
     and if they are equal, 
     increments the program counter by 2.
     """
-    if chip8.registers[get_Vx(opcode)] == chip8.registers[get_Vy(opcode)]:
+    if chip8.registers[x] == chip8.registers[y]:
         chip8.program_counter += 4
     else:
         chip8.program_counter += 2
 
-def _6xkk(chip8: Chip8, opcode):
+def _6xkk(chip8: Chip8, x, kk):
     """
     LD Vx, byte
     
@@ -203,10 +414,10 @@ def _6xkk(chip8: Chip8, opcode):
     
     The interpreter puts the value kk into register Vx.
     """
-    chip8.registers[get_Vx(opcode)] = get_kk(opcode)
+    chip8.registers[x] = kk
     chip8.program_counter += 2
 
-def _7xkk(chip8: Chip8, opcode):
+def _7xkk(chip8: Chip8, x, kk):
     """
     ADD Vx, byte
 
@@ -215,25 +426,13 @@ def _7xkk(chip8: Chip8, opcode):
     Adds the value kk to the value of register Vx, 
     then stores the result in Vx. 
     """
-    chip8.registers[get_Vx(opcode)] += get_kk(opcode)
+    chip8.registers[x] = (chip8.registers[x] + kk) & 0xFF
     chip8.program_counter += 2
 
-def _8(chip8: Chip8, opcode):
-    _8_instructions_map = {
-        0x0: _8xy0,
-        0x1: _8xy1,
-        0x2: _8xy2,
-        0x3: _8xy3,
-        0x4: _8xy4,
-        0x5: _8xy5,
-        0x6: _8xy6,
-        0x7: _8xy7,
-        0xE: _8xyE
-    }
-    _8_instructions_map[get_n(opcode)](chip8, opcode)
-    chip8.program_counter += 2
+def _8(opcode):
+    return _8_instructions_map[get_n(opcode)]
 
-def _8xy0(chip8: Chip8, opcode):
+def _8xy0(chip8: Chip8, x, y):
     """
     LD Vx, Vy
 
@@ -241,11 +440,10 @@ def _8xy0(chip8: Chip8, opcode):
 
     Stores the value of register Vy in register Vx.
     """
-    Vy_register_value = chip8.registers[get_Vy(opcode)]
-
-    chip8.registers[get_Vx(opcode)] = Vy_register_value
+    chip8.registers[x] = chip8.registers[y]
+    chip8.program_counter += 2
 
-def _8xy1(chip8: Chip8, opcode):
+def _8xy1(chip8: Chip8, x, y):
     """
     OR Vx, Vy
 
@@ -254,12 +452,10 @@ def _8xy1(chip8: Chip8, opcode):
     Performs a bitwise OR on the values of Vx and Vy, 
     then stores the result in Vx. 
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    Vy_register_value = chip8.registers[get_Vy(opcode)]
-
-    chip8.registers[get_Vx(opcode)] = Vx_register_value | Vy_register_value
+    chip8.registers[x] = chip8.registers[x] | chip8.registers[y]
+    chip8.program_counter += 2
 
-def _8xy2(chip8: Chip8, opcode):
+def _8xy2(chip8: Chip8, x, y):
     """
     AND Vx, Vy
 
@@ -268,12 +464,10 @@ def _8xy2(chip8: Chip8, opcode):
     Performs a bitwise AND on the values of Vx and Vy, 
     then stores the result in Vx. 
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    Vy_register_value = chip8.registers[get_Vy(opcode)]
-
-    chip8.registers[get_Vx(opcode)] = Vx_register_value & Vy_register_value
+    chip8.registers[x] = chip8.registers[x] & chip8.registers[y]
+    chip8.program_counter += 2
 
-def _8xy3(chip8: Chip8, opcode):
+def _8xy3(chip8: Chip8, x, y):
     """
     XOR Vx, Vy
 
@@ -282,12 +476,10 @@ def _8xy3(chip8: Chip8, opcode):
     Performs a bitwise exclusive OR on the values of Vx and Vy, 
     then stores the result in Vx. 
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    Vy_register_value = chip8.registers[get_Vy(opcode)]
-
-    chip8.registers[get_Vx(opcode)] = Vx_register_value ^ Vy_register_value
+    chip8.registers[x] = chip8.registers[x] ^ chip8.registers[y]
+    chip8.program_counter += 2
 
-def _8xy4(chip8: Chip8, opcode):
+def _8xy4(chip8: Chip8, x, y):
     """
     ADD Vx, Vy
 
@@ -299,18 +491,15 @@ def _8xy4(chip8: Chip8, opcode):
     Only the lowest 8 bits of the result are kept, 
     and stored in Vx.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    Vy_register_value = chip8.registers[get_Vy(opcode)]
-
-    registers_sum = Vx_register_value + Vy_register_value
-    chip8.registers[get_Vx(opcode)] = registers_sum & 0xFF
+    registers_sum = chip8.registers[x] + chip8.registers[y]
+    chip8.registers[x] = registers_sum & 0xFF
 
     if registers_sum > 255:
         chip8.registers[FLAG_REGISTER] = 1
 
+    chip8.program_counter += 2
 
-
-def _8xy5(chip8: Chip8, opcode):
+def _8xy5(chip8: Chip8, x, y):
     """
     SUB Vx, Vy
 
@@ -322,21 +511,18 @@ def _8xy5(chip8: Chip8, opcode):
     Then Vy is subtracted from Vx, 
     and the results stored in Vx.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    Vy_register_value = chip8.registers[get_Vy(opcode)]
-
-    registers_difference = 0
+    Vx_register_value = chip8.registers[x]
+    Vy_register_value = chip8.registers[y]
 
     if Vx_register_value > Vy_register_value:
         chip8.registers[FLAG_REGISTER] = 1
-        registers_difference = Vx_register_value - Vy_register_value
     else: 
         chip8.registers[FLAG_REGISTER] = 0
-        registers_difference = Vy_register_value - Vx_register_value
 
-    chip8.registers[get_Vx(opcode)] = registers_difference
+    chip8.registers[x] = (Vx_register_value - Vy_register_value) & 0xFF
+    chip8.program_counter += 2
 
-def _8xy6(chip8: Chip8, opcode):
+def _8xy6(chip8: Chip8, x, y):
     """
     SHR Vx {, Vy}
 
@@ -347,19 +533,17 @@ def _8xy6(chip8: Chip8, opcode):
     otherwise 0. 
     Then Vx is divided by 2.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
+    Vx_register_value = chip8.registers[x]
 
     if (Vx_register_value & 0x1) == 1:
         chip8.registers[FLAG_REGISTER] = 1
     else: 
         chip8.registers[FLAG_REGISTER] = 0
 
-    
-    chip8.registers[get_Vx(opcode)] = Vx_register_value // 2 
-
-    
+    chip8.registers[x] = Vx_register_value // 2 
+    chip8.program_counter += 2
 
-def _8xy7(chip8: Chip8, opcode):
+def _8xy7(chip8: Chip8, x, y):
     """
     SUBN Vx, Vy
 
@@ -371,21 +555,18 @@ def _8xy7(chip8: Chip8, opcode):
     Then Vx is subtracted from Vy,
     and the results stored in Vx.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    Vy_register_value = chip8.registers[get_Vy(opcode)]
-
-    registers_difference = 0
+    Vx_register_value = chip8.registers[x]
+    Vy_register_value = chip8.registers[y]
 
     if Vy_register_value > Vx_register_value:
         chip8.registers[FLAG_REGISTER] = 1
-        registers_difference = Vy_register_value - Vx_register_value
     else: 
         chip8.registers[FLAG_REGISTER] = 0
-        registers_difference = Vx_register_value - Vy_register_value
 
-    chip8.registers[get_Vx(opcode)] = registers_difference
+    chip8.registers[x] = (Vy_register_value - Vx_register_value) & 0xFF
+    chip8.program_counter += 2
 
-def _8xyE(chip8: Chip8, opcode):
+def _8xyE(chip8: Chip8, x, y):
     """
     SHL Vx {, Vy}
 
@@ -396,17 +577,17 @@ def _8xyE(chip8: Chip8, opcode):
     otherwise to 0. 
     Then Vx is multiplied by 2.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
+    Vx_register_value = chip8.registers[x]
 
-    if ((Vx_register_value & 0x8) >> 3) == 1:
+    if ((Vx_register_value & 0x80) >> 7) == 1:
         chip8.registers[FLAG_REGISTER] = 1
     else: 
         chip8.registers[FLAG_REGISTER] = 0
 
-    
-    chip8.registers[get_Vx(opcode)] = Vx_register_value * 2 
+    chip8.registers[x] = (Vx_register_value * 2) & 0xFF
+    chip8.program_counter += 2
 
-def _9xy0(chip8: Chip8, opcode):
+def _9xy0(chip8: Chip8, x, y):
     """
     SNE Vx, Vy
 
@@ -416,12 +597,12 @@ def _9xy0(chip8: Chip8, opcode):
     and if they are not equal, 
     the program counter is increased by 2.
     """
-    if chip8.registers[get_Vx(opcode)] != chip8.registers[get_Vy(opcode)]:
+    if chip8.registers[x] != chip8.registers[y]:
         chip8.program_counter += 4
     else:
         chip8.program_counter += 2
 
-def _Annn(chip8: Chip8, opcode):
+def _Annn(chip8: Chip8, nnn):
     """
     LD I, addr
 
@@ -429,10 +610,10 @@ def _Annn(chip8: Chip8, opcode):
 
     The value of register I is set to nnn.
     """
-    chip8.I = get_nnn(opcode)
+    chip8.I = nnn
     chip8.program_counter += 2
 
-def _Bnnn(chip8: Chip8, opcode):
+def _Bnnn(chip8: Chip8, nnn):
     """
     JP V0, addr
 
@@ -440,9 +621,9 @@ def _Bnnn(chip8: Chip8, opcode):
 
     The program counter is set to nnn plus the value of V0.
     """
-    chip8.program_counter = get_nnn(opcode) + chip8.registers[0]
+    chip8.program_counter = nnn + chip8.registers[0]
 
-def _Cxkk(chip8: Chip8, opcode):
+def _Cxkk(chip8: Chip8, x, kk):
     """
     RND Vx, byte
 
@@ -452,11 +633,13 @@ def _Cxkk(chip8: Chip8, opcode):
     which is then ANDed with the value kk. 
     The results are stored in Vx. 
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    chip8.registers[get_Vx(opcode)] = Vx_register_value & random.randint(0, 255)
+    if chip8.random_index == RANDOM_BLOCK_SIZE:
+        chip8.next_random_block()
+    chip8.registers[x] = chip8.random_bytes[chip8.random_index] & kk
+    chip8.random_index += 1
     chip8.program_counter += 2
 
-def _Dxyn(chip8: Chip8, opcode):
+def _Dxyn(chip8: Chip8, x, y, n):
     """
     DRW Vx, Vy, nibble
 
@@ -471,39 +654,38 @@ def _Dxyn(chip8: Chip8, opcode):
     VF is set to 1, 
     otherwise it is set to 0. 
     If the sprite is positioned so part of it is outside the coordinates of the display, 
-    it wraps around to the opposite side of the screen.
+    the part outside is clipped, see _Dxyn_wrap for the wrap_sprites quirk.
+
+    Each display row is a width bit int, so every sprite row is drawn with one shift and one XOR.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    Vy_register_value = chip8.registers[get_Vy(opcode)]
-    n = get_n(opcode)
+    Vx_register_value = chip8.registers[x]
+    Vy_register_value = chip8.registers[y]
+    memory = chip8.memory
+    display = chip8.display
 
     collision = 0
-    for i in range(n):
-        current_byte_to_display = chip8.memory[chip8.I + i]
-        for j in range(8):
-            mask = (0x80 >> j)
-            current_pixel_to_display = ((current_byte_to_display & mask) >> (7-j)) 
-            if (Vy_register_value + i) >= 32 or (j + Vx_register_value) >= 64:
-                continue
-            display_bit = (Vx_register_value + ((Vy_register_value + i) *64) + j)
-            old_pixel = chip8.display[display_bit] 
-            chip8.display[display_bit] ^= current_pixel_to_display
-            if old_pixel == 1 and chip8.display[display_bit]  == 0:
-                collision = 1
+    shift = chip8.width - 8 - Vx_register_value
+    rows = min(n, chip8.height - Vy_register_value)
+    if rows > 0:
+        chip8.dirty_rows |= ((1 << rows) - 1) << Vy_register_value
+    for i in range(rows):
+        row = Vy_register_value + i
+        if shift >= 0:
+            sprite_row = memory[chip8.I + i] << shift
+        else:
+            sprite_row = memory[chip8.I + i] >> -shift
+        if display[row] & sprite_row:
+            collision = 1
+        display[row] ^= sprite_row
 
     chip8.registers[FLAG_REGISTER] = collision
     chip8.program_counter += 2
     chip8.draw_flag = True
 
-def _E(chip8: Chip8, opcode):
-    _E_instructions_map = {
-        0x9E: _Ex9E,
-        0xA1: _ExA1
-    }
-
-    _E_instructions_map[get_kk(opcode)](chip8, opcode)
+def _E(opcode):
+    return _E_instructions_map[get_kk(opcode)]
 
-def _Ex9E(chip8: Chip8, opcode):
+def _Ex9E(chip8: Chip8, x):
     """
     SKP Vx
     
@@ -513,13 +695,12 @@ def _Ex9E(chip8: Chip8, opcode):
     and if the key corresponding to the value of Vx is currently in the down position, 
     PC is increased by 2.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    if chip8.keys[Vx_register_value] == 1:
+    if chip8.keys[chip8.registers[x]] == 1:
         chip8.program_counter += 4
     else:
         chip8.program_counter += 2
 
-def _ExA1(chip8: Chip8, opcode):
+def _ExA1(chip8: Chip8, x):
     """
     SKNP Vx
     
@@ -529,29 +710,15 @@ def _ExA1(chip8: Chip8, opcode):
     and if the key corresponding to the value of Vx is currently in the up position, 
     PC is increased by 2.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-
-    if chip8.keys[Vx_register_value] == 0:
+    if chip8.keys[chip8.registers[x]] == 0:
         chip8.program_counter += 4
     else:
         chip8.program_counter += 2
 
-def _F(chip8: Chip8, opcode):
-    _F_instructions_map = {
-        0x07: _Fx07,
-        0x0A: _Fx0A,
-        0x15: _Fx15,
-        0x18: _Fx18,
-        0x1E: _Fx1E,
-        0x29: _Fx29,
-        0x33: _Fx33,
-        0x55: _Fx55,
-        0x65: _Fx65
-    }
-    _F_instructions_map[get_kk(opcode)](chip8, opcode)
+def _F(opcode):
+    return _F_instructions_map[get_kk(opcode)]
 
-
-def _Fx07(chip8: Chip8, opcode):
+def _Fx07(chip8: Chip8, x):
     """
     LD Vx, DT
 
@@ -559,10 +726,10 @@ def _Fx07(chip8: Chip8, opcode):
 
     The value of DT is placed into Vx.
     """
-    chip8.registers[get_Vx(opcode)] = chip8.DT
+    chip8.registers[x] = chip8.DT
     chip8.program_counter += 2
 
-def _Fx0A(chip8: Chip8, opcode):
+def _Fx0A(chip8: Chip8, x):
     """
     LD Vx, K
 
@@ -574,11 +741,11 @@ def _Fx0A(chip8: Chip8, opcode):
     """
     for key, keyValue in enumerate(chip8.keys):
         if keyValue == 1:
-            chip8.registers[get_Vx(opcode)] = key
+            chip8.registers[x] = key
             chip8.program_counter += 2
             return
 
-def _Fx15(chip8: Chip8, opcode):
+def _Fx15(chip8: Chip8, x):
     """
     LD DT, Vx
 
@@ -586,11 +753,10 @@ def _Fx15(chip8: Chip8, opcode):
 
     DT is set equal to the value of Vx.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    chip8.DT = Vx_register_value
+    chip8.DT = chip8.registers[x]
     chip8.program_counter += 2
 
-def _Fx18(chip8: Chip8, opcode):
+def _Fx18(chip8: Chip8, x):
     """
     LD ST, Vx
     
@@ -598,11 +764,10 @@ def _Fx18(chip8: Chip8, opcode):
 
     ST is set equal to the value of Vx.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    chip8.ST = Vx_register_value
+    chip8.ST = chip8.registers[x]
     chip8.program_counter += 2
 
-def _Fx1E(chip8: Chip8, opcode):
+def _Fx1E(chip8: Chip8, x):
     """
     ADD I, Vx
 
@@ -611,11 +776,10 @@ def _Fx1E(chip8: Chip8, opcode):
     The values of I and Vx are added, 
     and the results are stored in I.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    chip8.I += Vx_register_value
+    chip8.I += chip8.registers[x]
     chip8.program_counter += 2
 
-def _Fx29(chip8: Chip8, opcode):
+def _Fx29(chip8: Chip8, x):
     """
     LD F, Vx
 
@@ -625,11 +789,10 @@ def _Fx29(chip8: Chip8, opcode):
     
     See section 2.4, Display, for more information on the Chip-8 hexadecimal font.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
-    chip8.I = (Vx_register_value * 5)
+    chip8.I = (chip8.registers[x] * 5)
     chip8.program_counter += 2
 
-def _Fx33(chip8: Chip8, opcode):
+def _Fx33(chip8: Chip8, x):
     """
     LD B, Vx
     
@@ -640,15 +803,16 @@ def _Fx33(chip8: Chip8, opcode):
     the tens digit at location I+1, 
     and the ones digit at location I+2.
     """
-    Vx_register_value = chip8.registers[get_Vx(opcode)]
+    Vx_register_value = chip8.registers[x]
 
     chip8.memory[chip8.I] = Vx_register_value // 100
     chip8.memory[chip8.I + 1] = (Vx_register_value % 100) // 10
     chip8.memory[chip8.I + 2] = Vx_register_value % 10
+    chip8.invalidate_code(chip8.I, 3)
 
     chip8.program_counter += 2
 
-def _Fx55(chip8: Chip8, opcode):
+def _Fx55(chip8: Chip8, x):
     """
     LD [I], Vx
 
@@ -657,13 +821,15 @@ def _Fx55(chip8: Chip8, opcode):
     The interpreter copies the values of registers V0 through Vx into memory, 
     starting at the address in I.
     """
-    for register_index in range(get_Vx(opcode) + 1):
-        chip8.memory[register_index + chip8.I] = chip8.registers[register_index]
+    if chip8.I + x >= len(chip8.memory):
+        raise IndexError('LD [I], V%X writes past the end of memory' % x)
+    chip8.memory[chip8.I:chip8.I + x + 1] = chip8.registers[:x + 1]
+    chip8.invalidate_code(chip8.I, x + 1)
 
-    chip8.I += (get_Vx(opcode) + 1)
+    chip8.I += (x + 1)
     chip8.program_counter += 2
 
-def _Fx65(chip8: Chip8, opcode):
+def _Fx65(chip8: Chip8, x):
     """
     LD Vx, [I]
 
@@ -671,11 +837,266 @@ def _Fx65(chip8: Chip8, opcode):
 
     The interpreter reads values from memory starting at location I into registers V0 through Vx.
     """
-    for register_index in range(get_Vx(opcode) + 1):
-         chip8.registers[register_index] = chip8.memory[register_index + chip8.I]
+    if chip8.I + x >= len(chip8.memory):
+        raise IndexError('LD V%X, [I] reads past the end of memory' % x)
+    chip8.registers[:x + 1] = chip8.memory[chip8.I:chip8.I + x + 1]
+
+    chip8.I += (x + 1)
+    chip8.program_counter += 2
+
+#QUIRKS, handlers decoded in place of the standard ones when a quirk is on, see quirk_handlers
+def _8xy1_reset_vf(chip8: Chip8, x, y):
+    """
+    OR Vx, Vy with the logic_reset_vf quirk, VF is set to 0 afterwards
+    """
+    chip8.registers[x] = chip8.registers[x] | chip8.registers[y]
+    chip8.registers[FLAG_REGISTER] = 0
+    chip8.program_counter += 2
+
+def _8xy2_reset_vf(chip8: Chip8, x, y):
+    """
+    AND Vx, Vy with the logic_reset_vf quirk, VF is set to 0 afterwards
+    """
+    chip8.registers[x] = chip8.registers[x] & chip8.registers[y]
+    chip8.registers[FLAG_REGISTER] = 0
+    chip8.program_counter += 2
+
+def _8xy3_reset_vf(chip8: Chip8, x, y):
+    """
+    XOR Vx, Vy with the logic_reset_vf quirk, VF is set to 0 afterwards
+    """
+    chip8.registers[x] = chip8.registers[x] ^ chip8.registers[y]
+    chip8.registers[FLAG_REGISTER] = 0
+    chip8.program_counter += 2
+
+def _8xy6_shift_vy(chip8: Chip8, x, y):
+    """
+    SHR Vx, Vy with the shift_vy quirk
+
+    Set Vx = Vy SHR 1, then VF = the bit shifted out of Vy.
+    VF is written last like the COSMAC VIP, so it holds the flag even when x is F.
+    """
+    Vy_register_value = chip8.registers[y]
+    chip8.registers[x] = Vy_register_value >> 1
+    chip8.registers[FLAG_REGISTER] = Vy_register_value & 0x1
+    chip8.program_counter += 2
+
+def _8xyE_shift_vy(chip8: Chip8, x, y):
+    """
+    SHL Vx, Vy with the shift_vy quirk
+
+    Set Vx = Vy SHL 1, then VF = the bit shifted out of Vy.
+    VF is written last like the COSMAC VIP, so it holds the flag even when x is F.
+    """
+    Vy_register_value = chip8.registers[y]
+    chip8.registers[x] = (Vy_register_value << 1) & 0xFF
+    chip8.registers[FLAG_REGISTER] = Vy_register_value >> 7
+    chip8.program_counter += 2
+
+def _Bxnn(chip8: Chip8, nnn):
+    """
+    JP Vx, addr with the jump_vx quirk
+
+    Jump to location nnn + Vx, where x is the top nibble of nnn.
+    """
+    chip8.program_counter = nnn + chip8.registers[nnn >> 8]
+
+def _Dxyn_wrap(chip8: Chip8, x, y, n):
+    """
+    DRW Vx, Vy, nibble with the wrap_sprites quirk
+
+    Like _Dxyn, but the parts of the sprite outside the display wrap around to the opposite side.
+    """
+    width = chip8.width
+    Vx_register_value = chip8.registers[x] % width
+    Vy_register_value = chip8.registers[y]
+    memory = chip8.memory
+    display = chip8.display
+    row_mask = (1 << width) - 1
+
+    collision = 0
+    for i in range(n):
+        row = (Vy_register_value + i) % chip8.height
+        sprite_row = memory[chip8.I + i] << (width - 8)
+        sprite_row = ((sprite_row >> Vx_register_value) | (sprite_row << (width - Vx_register_value))) & row_mask
+        if display[row] & sprite_row:
+            collision = 1
+        display[row] ^= sprite_row
+        chip8.dirty_rows |= 1 << row
+
+    chip8.registers[FLAG_REGISTER] = collision
+    chip8.program_counter += 2
+    chip8.draw_flag = True
+
+def _Fx55_increment_x(chip8: Chip8, x):
+    """
+    LD [I], Vx with the CHIP-48 load_store quirk, I is increased by x rather than x + 1
+    """
+    _Fx55(chip8, x)
+    chip8.I -= 1
+
+def _Fx55_keep_i(chip8: Chip8, x):
+    """
+    LD [I], Vx with the SUPER-CHIP load_store quirk, I is left unchanged
+    """
+    _Fx55(chip8, x)
+    chip8.I -= x + 1
+
+def _Fx65_increment_x(chip8: Chip8, x):
+    """
+    LD Vx, [I] with the CHIP-48 load_store quirk, I is increased by x rather than x + 1
+    """
+    _Fx65(chip8, x)
+    chip8.I -= 1
+
+def _Fx65_keep_i(chip8: Chip8, x):
+    """
+    LD Vx, [I] with the SUPER-CHIP load_store quirk, I is left unchanged
+    """
+    _Fx65(chip8, x)
+    chip8.I -= x + 1
+
+#SUPER-CHIP, decoded on top of the standard instructions when the extended quirk is on, see decode_extended
+def _00Cn(chip8: Chip8, n):
+    """
+    SCD nibble
+
+    Scroll the display down n rows, the rows scrolled in at the top are blank.
+    """
+    if n:
+        chip8.display = [0] * n + chip8.display[:chip8.height - n]
+        chip8.dirty_rows = (1 << chip8.height) - 1
+    chip8.program_counter += 2
+    chip8.draw_flag = True
+
+def _00FB(chip8: Chip8):
+    """
+    SCR
+
+    Scroll the display right 4 pixels.
+    """
+    chip8.display = [row >> 4 for row in chip8.display]
+    chip8.dirty_rows = (1 << chip8.height) - 1
+    chip8.program_counter += 2
+    chip8.draw_flag = True
+
+def _00FC(chip8: Chip8):
+    """
+    SCL
+
+    Scroll the display left 4 pixels.
+    """
+    row_mask = (1 << chip8.width) - 1
+    chip8.display = [(row << 4) & row_mask for row in chip8.display]
+    chip8.dirty_rows = (1 << chip8.height) - 1
+    chip8.program_counter += 2
+    chip8.draw_flag = True
+
+def _00FD(chip8: Chip8):
+    """
+    EXIT
+
+    Exit the interpreter, the program counter stays on this instruction so the machine halts.
+    """
 
-    chip8.I += (get_Vx(opcode) + 1)
+def _00FE(chip8: Chip8):
+    """
+    LOW
+
+    Switch to the 64x32 display, clearing it.
+    """
+    chip8.set_resolution(False)
     chip8.program_counter += 2
+    chip8.draw_flag = True
+
+def _00FF(chip8: Chip8):
+    """
+    HIGH
+
+    Switch to the 128x64 display, clearing it.
+    """
+    chip8.set_resolution(True)
+    chip8.program_counter += 2
+    chip8.draw_flag = True
+
+def _Dxy0(chip8: Chip8, x, y):
+    """
+    DRW Vx, Vy, 0
+
+    Display the 16x16 sprite starting at memory location I at (Vx, Vy), set VF = collision.
+    Each sprite row is 2 bytes, the parts outside the display are clipped like _Dxyn.
+    """
+    Vx_register_value = chip8.registers[x]
+    Vy_register_value = chip8.registers[y]
+    memory = chip8.memory
+    display = chip8.display
+
+    collision = 0
+    shift = chip8.width - 16 - Vx_register_value
+    rows = min(16, chip8.height - Vy_register_value)
+    if rows > 0:
+        chip8.dirty_rows |= ((1 << rows) - 1) << Vy_register_value
+    for i in range(rows):
+        row = Vy_register_value + i
+        sprite_row = (memory[chip8.I + 2 * i] << 8) | memory[chip8.I + 2 * i + 1]
+        if shift >= 0:
+            sprite_row <<= shift
+        else:
+            sprite_row >>= -shift
+        if display[row] & sprite_row:
+            collision = 1
+        display[row] ^= sprite_row
+
+    chip8.registers[FLAG_REGISTER] = collision
+    chip8.program_counter += 2
+    chip8.draw_flag = True
+
+def _Fx30(chip8: Chip8, x):
+    """
+    LD HF, Vx
+
+    Set I = location of the 8x10 sprite for digit Vx, see BIG_FONTS.
+    """
+    chip8.I = BIG_FONTS_LOCATION + (chip8.registers[x] & 0xF) * 10
+    chip8.program_counter += 2
+
+def _Fx75(chip8: Chip8, x):
+    """
+    LD R, Vx
+
+    Store registers V0 through Vx in the flag registers.
+    """
+    chip8.flag_registers[:x + 1] = chip8.registers[:x + 1]
+    chip8.program_counter += 2
+
+def _Fx85(chip8: Chip8, x):
+    """
+    LD Vx, R
+
+    Read registers V0 through Vx from the flag registers.
+    """
+    chip8.registers[:x + 1] = chip8.flag_registers[:x + 1]
+    chip8.program_counter += 2
+
+def quirk_handlers(quirks):
+    """
+    The handler to run in place of each standard handler under quirks,
+    handlers not in it run as they are
+    """
+    handlers = {}
+    if quirks.shift_vy:
+        handlers.update({_8xy6: _8xy6_shift_vy, _8xyE: _8xyE_shift_vy})
+    if quirks.logic_reset_vf:
+        handlers.update({_8xy1: _8xy1_reset_vf, _8xy2: _8xy2_reset_vf, _8xy3: _8xy3_reset_vf})
+    if quirks.load_store == 'increment_x':
+        handlers.update({_Fx55: _Fx55_increment_x, _Fx65: _Fx65_increment_x})
+    elif quirks.load_store == 'unchanged':
+        handlers.update({_Fx55: _Fx55_keep_i, _Fx65: _Fx65_keep_i})
+    if quirks.jump_vx:
+        handlers[_Bnnn] = _Bxnn
+    if quirks.wrap_sprites:
+        handlers[_Dxyn] = _Dxyn_wrap
+    return handlers
 
 instruction_map = {
     0x0: _0,
@@ -696,6 +1117,84 @@ instruction_map = {
     0xF: _F
 }
 
+_8_instructions_map = {
+    0x0: _8xy0,
+    0x1: _8xy1,
+    0x2: _8xy2,
+    0x3: _8xy3,
+    0x4: _8xy4,
+    0x5: _8xy5,
+    0x6: _8xy6,
+    0x7: _8xy7,
+    0xE: _8xyE
+}
+
+_E_instructions_map = {
+    0x9E: _Ex9E,
+    0xA1: _ExA1
+}
+
+_F_instructions_map = {
+    0x07: _Fx07,
+    0x0A: _Fx0A,
+    0x15: _Fx15,
+    0x18: _Fx18,
+    0x1E: _Fx1E,
+    0x29: _Fx29,
+    0x33: _Fx33,
+    0x55: _Fx55,
+    0x65: _Fx65
+}
+
+_extended_0_instructions_map = {
+    0x00FB: _00FB,
+    0x00FC: _00FC,
+    0x00FD: _00FD,
+    0x00FE: _00FE,
+    0x00FF: _00FF
+}
+
+_extended_F_instructions_map = {
+    0x30: _Fx30,
+    0x75: _Fx75,
+    0x85: _Fx85
+}
+
+#families whose handler depends on more than the first nibble
+instruction_families = (_0, _8, _E, _F)
+
+def decode(opcode):
+    """
+    Looks up the handler for opcode and extracts the operands it is called with.
+
+    Returns (handler, operands) so the handler can be run as handler(chip8, *operands)
+    """
+    handler = instruction_map[(opcode & 0xf000) >> 12]
+    if handler in instruction_families:
+        handler = handler(opcode)
+    return handler, instruction_operands[handler](opcode)
+
+def decode_extended(opcode):
+    """
+    Looks up the SUPER-CHIP handler for opcode like decode,
+    returns None when opcode is not one SUPER-CHIP adds
+    """
+    family = opcode >> 12
+    if family == 0x0:
+        if opcode & 0xFFF0 == 0x00C0:
+            return _00Cn, (get_n(opcode),)
+        handler = _extended_0_instructions_map.get(opcode)
+    elif family == 0xD and get_n(opcode) == 0:
+        handler = _Dxy0
+    elif family == 0xF:
+        handler = _extended_F_instructions_map.get(get_kk(opcode))
+    else:
+        return None
+    if handler is None:
+        return None
+    return handler, instruction_operands[handler](opcode)
+
+
 #can be moved to a seperate file probably
 def get_nnn(opcode):
     return opcode & 0x0FFF
@@ -712,3 +1211,69 @@ def get_kk(opcode):
 
 def get_n(opcode):
     return opcode & 0x000F
+
+def no_operands(opcode):
+    return ()
+
+def nnn_operands(opcode):
+    return (get_nnn(opcode),)
+
+def x_operands(opcode):
+    return (get_Vx(opcode),)
+
+def xy_operands(opcode):
+    return (get_Vx(opcode), get_Vy(opcode))
+
+def xkk_operands(opcode):
+    return (get_Vx(opcode), get_kk(opcode))
+
+def xyn_operands(opcode):
+    return (get_Vx(opcode), get_Vy(opcode), get_n(opcode))
+
+instruction_operands = {
+    _0nnn: nnn_operands,
+    _00E0: no_operands,
+    _00EE: no_operands,
+    _1nnn: nnn_operands,
+    _2nnn: nnn_operands,
+    _3xkk: xkk_operands,
+    _4xkk: xkk_operands,
+    _5xy0: xy_operands,
+    _6xkk: xkk_operands,
+    _7xkk: xkk_operands,
+    _8xy0: xy_operands,
+    _8xy1: xy_operands,
+    _8xy2: xy_operands,
+    _8xy3: xy_operands,
+    _8xy4: xy_operands,
+    _8xy5: xy_operands,
+    _8xy6: xy_operands,
+    _8xy7: xy_operands,
+    _8xyE: xy_operands,
+    _9xy0: xy_operands,
+    _Annn: nnn_operands,
+    _Bnnn: nnn_operands,
+    _Cxkk: xkk_operands,
+    _Dxyn: xyn_operands,
+    _Ex9E: x_operands,
+    _ExA1: x_operands,
+    _Fx07: x_operands,
+    _Fx0A: x_operands,
+    _Fx15: x_operands,
+    _Fx18: x_operands,
+    _Fx1E: x_operands,
+    _Fx29: x_operands,
+    _Fx33: x_operands,
+    _Fx55: x_operands,
+    _Fx65: x_operands,
+    _00FB: no_operands,
+    _00FC: no_operands,
+    _00FD: no_operands,
+    _00FE: no_operands,
+    _00FF: no_operands,
+    _Dxy0: xy_operands,
+    _Fx30: x_operands,
+    _Fx75: x_operands,
+    _Fx85: x_operands
+}
+
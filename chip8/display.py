@@ -1,6 +1,8 @@
-import pygame
+import pygame, sys
 from pygame.locals import *
 
+RENDERERS = ('rects', 'surface')
+
 class Chip8Display(object):
     size = (640, 320)
 
@@ -10,18 +12,138 @@ class Chip8Display(object):
     foreground = (1, 3, 17)
     background = (148, 150, 126)
 
-    def __init__(self, pygame):
-        self.pygame = pygame  
+    def __init__(self, pygame, renderer='rects', grid=True):
+        """
+        renderer picks how the display is drawn to the window.
+        rects repaints each changed pixel as a rect, cheapest when little changes.
+        surface writes the whole display into a surface the size of the display and scales it to the window in one blit,
+        so drawing costs the same no matter how many pixels are lit or changed.
+
+        grid keeps the 1px gap between pixels of the surface renderer, the rects renderer always has it.
+        The window stays the same size when a SUPER-CHIP rom switches to 128x64, the pixels shrink instead.
+        """
+        if renderer not in RENDERERS:
+            raise ValueError('Unknown renderer %r, expected one of %s' % (renderer, ', '.join(RENDERERS)))
+        self.pygame = pygame
+        self.renderer = renderer
         self.screen = self.pygame.display.set_mode(self.size, DOUBLEBUF)
+        self.grid = grid if renderer == 'surface' else True
+        self.byte_pixels = None
+        self.set_resolution(64, 32)
+
+    def set_resolution(self, columns, rows):
+        """
+        Blanks the window and sizes the pixels for a columns by rows display
+        """
+        self.columns = columns
+        self.rows = rows
+        self.cell = self.width // columns #window pixels per display pixel, including the 1px gap
         self.screen.fill(self.background)
+        self.presented = [0] * rows #display rows as they are currently on the screen
+
+        if self.renderer == 'surface':
+            self.pixels = self.pygame.Surface((columns, rows), 0, self.screen) #same format as the screen so it scales straight onto it
+            self.pixels.fill(self.background)
+            if self.byte_pixels is None:
+                self.byte_pixels = self.make_byte_pixels()
+            self.grid_overlay = self.make_grid_overlay() if self.grid else None
+        self.pygame.display.update()
+
+    def make_byte_pixels(self):
+        """
+        The raw pixel data of the 8 pixels of every possible display byte, in the format of the screen
+        """
+        bytes_per_pixel = self.pixels.get_bytesize()
+        colors = [
+            self.pixels.map_rgb(color).to_bytes(bytes_per_pixel, sys.byteorder)
+            for color in (self.background, self.foreground)
+        ]
+        return [b''.join(colors[(byte >> (7 - bit)) & 1] for bit in range(8)) for byte in range(256)]
+
+    def make_grid_overlay(self):
+        """
+        A window sized surface that is transparent except for the 1px gap right and below every pixel
+        """
+        overlay = self.pygame.Surface(self.size)
+        transparent = (255, 0, 255)
+        overlay.fill(transparent)
+        overlay.set_colorkey(transparent)
+        cell = self.cell
+        for col in range(self.columns):
+            self.pygame.draw.line(overlay, self.background, (col*cell + cell - 1, 0), (col*cell + cell - 1, self.height - 1))
+        for row in range(self.rows):
+            self.pygame.draw.line(overlay, self.background, (0, row*cell + cell - 1), (self.width - 1, row*cell + cell - 1))
+        return overlay.convert()
 
     def draw(self, chip8):
-        if chip8.draw_flag:
-            chip8.draw_flag = False
-            for row in range(32):
-                for col in range(64):
-                    pixel_location = row * 64 + col
-                    pixel = chip8.display[pixel_location]
-                    pixel_color = self.foreground if pixel == 1 else self.background
-                    self.pygame.draw.rect(self.screen, pixel_color, (col*10, row*10, 9, 9))
-            self.pygame.display.update()
\ No newline at end of file
+        dirty_rows = chip8.dirty_rows
+        if not dirty_rows:
+            return
+        chip8.dirty_rows = 0
+        chip8.draw_flag = False
+        if chip8.width != self.columns:
+            self.set_resolution(chip8.width, chip8.height)
+
+        if self.renderer == 'surface':
+            self.draw_surface(chip8, dirty_rows)
+        else:
+            self.draw_rects(chip8, dirty_rows)
+
+    def draw_rects(self, chip8, dirty_rows):
+        """
+        Repaints only the pixels that changed in the rows chip8 marked dirty,
+        and updates just the part of the window covering them
+        """
+        rects = []
+        columns = self.columns
+        cell = self.cell
+        for row in range(self.rows):
+            if not (dirty_rows >> row) & 1:
+                continue
+            row_pixels = chip8.display[row]
+            changed = row_pixels ^ self.presented[row]
+            if not changed:
+                continue
+            self.presented[row] = row_pixels
+
+            pixels = changed
+            while pixels:
+                pixel = pixels & -pixels
+                col = columns - pixel.bit_length()
+                pixel_color = self.foreground if row_pixels & pixel else self.background
+                self.pygame.draw.rect(self.screen, pixel_color, (col*cell, row*cell, cell - 1, cell - 1))
+                pixels ^= pixel
+
+            first_col = columns - changed.bit_length()
+            last_col = columns - (changed & -changed).bit_length()
+            rects.append((first_col*cell, row*cell, (last_col - first_col)*cell + cell - 1, cell - 1))
+
+        if rects:
+            self.pygame.display.update(rects)
+
+    def draw_surface(self, chip8, dirty_rows):
+        """
+        Writes the changed rows straight into the pixel buffer,
+        then scales the whole buffer to the window in one blit
+        """
+        changed = False
+        pitch = self.pixels.get_pitch()
+        buffer = self.pixels.get_buffer()
+        shifts = range(self.columns - 8, -8, -8)
+        for row in range(self.rows):
+            if not (dirty_rows >> row) & 1:
+                continue
+            row_pixels = chip8.display[row]
+            if row_pixels == self.presented[row]:
+                continue
+            self.presented[row] = row_pixels
+            buffer.write(b''.join([self.byte_pixels[(row_pixels >> shift) & 0xFF] for shift in shifts]), row * pitch)
+            changed = True
+        del buffer #releases the lock get_buffer holds on the surface
+
+        if not changed:
+            return
+        self.pygame.transform.scale(self.pixels, self.size, self.screen)
+        if self.grid_overlay is not None:
+            self.screen.blit(self.grid_overlay, (0, 0))
+        self.pygame.display.update()
@@ -0,0 +1,28 @@
+from chip8.blocks import BlockEngine
+
+class Interpreter(object):
+    """
+    Runs a Chip8 one perform_cycle at a time, the reference every other engine must match
+    """
+    def __init__(self, chip8):
+        self.chip8 = chip8
+
+    def run(self, cycles):
+        perform_cycle = self.chip8.perform_cycle
+        for _ in range(cycles):
+            perform_cycle()
+        return cycles
+
+    def step(self):
+        self.chip8.perform_cycle()
+        return 1
+
+ENGINES = {
+    'interpreter': Interpreter,
+    'blocks': BlockEngine
+}
+
+def create_engine(name, chip8):
+    if name not in ENGINES:
+        raise ValueError('Unknown engine %r, expected one of %s' % (name, ', '.join(sorted(ENGINES))))
+    return ENGINES[name](chip8)
@@ -0,0 +1,222 @@
+"""
+Gym style environments for training agents on chip 8 roms, with no window, sound or pygame.
+
+ex.
+    env = Chip8Env('roms/PONG', frame_skip=4, reward=pong_score)
+    observation = env.reset(seed=0)
+    while True:
+        observation, reward, done, info = env.step(action)
+        if done:
+            break
+
+An action is the 16 bit mask of the keys to hold, see headless.set_keys.
+Needs numpy, which nothing else in the emulator does.
+"""
+import os
+from multiprocessing import Pipe, Process
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from chip8.chip8 import Chip8, read_rom
+from chip8.engines import create_engine
+from chip8.headless import set_keys
+from chip8.scheduler import INSTRUCTIONS_PER_FRAME, Scheduler
+
+OBSERVATION_SHAPE = (32, 64)
+PIXEL_SHIFTS = np.arange(63, -1, -1, dtype=np.uint64) #column 0 is the top bit of each display row
+
+class Chip8Env(object):
+    """
+    Runs a rom frame_skip 60HZ frames per step with the action's keys held.
+
+    reward(chip8) and done(chip8) are hooks called after every step to score the game and end the
+    episode, without them the reward is always 0 and episodes only end after max_frames frames.
+
+    The observation is a (32, 64) uint8 array of 0 and 1 that is allocated once and rewritten
+    in place by every reset and step, copy it to keep it past the next step.
+    """
+    def __init__(self, rom_name, frame_skip=4, reward=None, done=None, max_frames=None,
+                 engine='interpreter', instructions_per_frame=INSTRUCTIONS_PER_FRAME,
+                 rom_data=None, wrap_sprites=False, seed=None, quirks=None):
+        self.chip8 = Chip8(rom_name, rom_data, wrap_sprites, seed, quirks)
+        self.scheduler = Scheduler(self.chip8, create_engine(engine, self.chip8), instructions_per_frame, turbo=True)
+        self.frame_skip = frame_skip
+        self.reward = reward
+        self.done = done
+        self.max_frames = max_frames
+        self.frames = 0 #frames run since the last reset
+
+        self.observation = np.zeros(OBSERVATION_SHAPE, dtype=np.uint8)
+        self.display_rows = np.zeros(32, dtype=np.uint64)
+        self.shifted_rows = np.zeros(OBSERVATION_SHAPE, dtype=np.uint64)
+        self.update_observation()
+
+    def update_observation(self):
+        """
+        Unpacks the display rows that changed since the last observation into the observation buffer
+        """
+        if not self.chip8.dirty_rows:
+            return
+        if self.chip8.hires:
+            raise ValueError('%s switched to the 128x64 display, Chip8Env only observes 64x32' % self.chip8.rom_name)
+        self.chip8.dirty_rows = 0
+        self.display_rows[:] = self.chip8.display
+        np.right_shift(self.display_rows[:, None], PIXEL_SHIFTS, out=self.shifted_rows)
+        np.bitwise_and(self.shifted_rows, 1, out=self.shifted_rows)
+        np.copyto(self.observation, self.shifted_rows, casting='unsafe')
+
+    def reset(self, seed=None):
+        """
+        Restarts the rom, seed restarts the random numbers too, otherwise they carry on from the last episode
+        """
+        self.chip8.reset()
+        if seed is not None:
+            self.chip8.seed_random(seed)
+        self.frames = 0
+        self.update_observation()
+        return self.observation
+
+    def step(self, action):
+        set_keys(self.chip8, action)
+        for _ in range(self.frame_skip):
+            self.scheduler.run_frame()
+        self.frames += self.frame_skip
+        self.update_observation()
+
+        reward = self.reward(self.chip8) if self.reward is not None else 0.0
+        done = bool(self.done(self.chip8)) if self.done is not None else False
+        info = {'frames': self.frames}
+        if self.max_frames is not None and self.frames >= self.max_frames:
+            info['truncated'] = not done
+            done = True
+        return self.observation, reward, done, info
+
+def _env_worker(connection, shared_memory_name, count, first, env_options):
+    """
+    Hosts environments first to first+len(env_options) of a VectorChip8Env,
+    writing their observations straight into the shared observation buffer
+    """
+    shared_memory = SharedMemory(shared_memory_name)
+    observations = np.ndarray((count,) + OBSERVATION_SHAPE, dtype=np.uint8, buffer=shared_memory.buf)
+    envs = [Chip8Env(**options) for options in env_options]
+    try:
+        while True:
+            command, data = connection.recv()
+            if command == 'close':
+                break
+            #every env runs the command even if one before it fails, so none fall a step behind,
+            #and the first error is sent back in place of the results
+            error = None
+            results = []
+            for index, (env, item) in enumerate(zip(envs, data)):
+                try:
+                    if command == 'reset':
+                        observations[first + index] = env.reset(item)
+                    elif command == 'step':
+                        observation, reward, done, info = env.step(item)
+                        if done:
+                            #start the next episode straight away, keeping the one that just ended in info
+                            info['terminal_observation'] = observation.copy()
+                            observation = env.reset()
+                        observations[first + index] = observation
+                        results.append((reward, done, info))
+                except Exception as env_error:
+                    if error is None:
+                        error = env_error
+            if error is not None:
+                connection.send((False, error))
+            else:
+                connection.send((True, results if command == 'step' else None))
+    finally:
+        del observations
+        shared_memory.close()
+        connection.close()
+
+class VectorChip8Env(object):
+    """
+    count Chip8Envs stepped together, split across workers processes, one per cpu by default.
+
+    Observations are written by the workers into one shared (count, 32, 64) buffer that every
+    reset and step returns, so they are never pickled. Environments that finish an episode
+    are reset straight away, the final observation of the episode is in info['terminal_observation'].
+
+    Every other keyword is passed to Chip8Env, hooks must be picklable module level functions.
+    """
+    def __init__(self, rom_name, count, workers=None, **env_options):
+        if env_options.get('rom_data') is None:
+            env_options['rom_data'] = read_rom(rom_name)
+        env_options['rom_name'] = rom_name
+        self.count = count
+        workers = max(1, min(count, workers or os.cpu_count()))
+
+        self.shared_memory = SharedMemory(create=True, size=count * OBSERVATION_SHAPE[0] * OBSERVATION_SHAPE[1])
+        self.observations = np.ndarray((count,) + OBSERVATION_SHAPE, dtype=np.uint8, buffer=self.shared_memory.buf)
+        self.slices = []
+        self.connections = []
+        self.processes = []
+        for worker in range(workers):
+            first, last = count * worker // workers, count * (worker + 1) // workers
+            connection, worker_connection = Pipe()
+            process = Process(
+                target=_env_worker,
+                args=(worker_connection, self.shared_memory.name, count, first, [env_options] * (last - first)),
+                daemon=True
+            )
+            process.start()
+            worker_connection.close()
+            self.slices.append(slice(first, last))
+            self.connections.append(connection)
+            self.processes.append(process)
+        self.closed = False
+
+    def __len__(self):
+        return self.count
+
+    def call(self, command, data):
+        for connection, part in zip(self.connections, self.slices):
+            connection.send((command, data[part]))
+        #read every reply before raising, a reply left in a pipe would answer the next command
+        replies = [connection.recv() for connection in self.connections]
+        results = []
+        for ok, result in replies:
+            if not ok:
+                raise result
+            if result is not None:
+                results.extend(result)
+        return results
+
+    def reset(self, seeds=None):
+        """
+        Resets every environment, seeds gives the random seed of each one
+        """
+        self.call('reset', [None] * self.count if seeds is None else list(seeds))
+        return self.observations
+
+    def step(self, actions):
+        """
+        Steps every environment with its action, returns (observations, rewards, dones, infos)
+        """
+        results = self.call('step', list(actions))
+        rewards = np.array([reward for reward, _, _ in results], dtype=np.float64)
+        dones = np.array([done for _, done, _ in results], dtype=bool)
+        return self.observations, rewards, dones, [info for _, _, info in results]
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for connection in self.connections:
+            connection.send(('close', None))
+            connection.close()
+        for process in self.processes:
+            process.join()
+        del self.observations
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
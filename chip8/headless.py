@@ -0,0 +1,123 @@
+import hashlib
+import time
+
+from chip8.chip8 import Chip8
+from chip8.engines import create_engine
+from chip8.scheduler import INSTRUCTIONS_PER_FRAME, Scheduler
+
+def state_hashes(chip8: Chip8):
+    """
+    SHA-1 of each part of the machine state, two runs ended in the same state
+    if and only if all of these match
+    """
+    def digest(buffer):
+        return hashlib.sha1(buffer).hexdigest()
+
+    cpu = '%d %d %d %d %d' % (chip8.program_counter, chip8.I, chip8.DT, chip8.ST, chip8.stack_pointer)
+    return {
+        'cpu': digest(cpu.encode()),
+        'registers': digest(chip8.registers),
+        'stack': digest(chip8.stack[:chip8.stack_pointer]),
+        'memory': digest(chip8.memory),
+        'display': digest(chip8.display_buffer())
+    }
+
+def set_keys(chip8: Chip8, key_mask):
+    """
+    Presses every key whose bit is set in the 16 bit key_mask, and releases the rest
+    """
+    for key in range(16):
+        chip8.keys[key] = (key_mask >> key) & 1
+
+def key_mask(chip8: Chip8):
+    """
+    The keys currently held as a 16 bit mask, bit n set when key n is down
+    """
+    mask = 0
+    for key in range(16):
+        if chip8.keys[key]:
+            mask |= 1 << key
+    return mask
+
+def demo_input(frame):
+    """
+    Scripted input that holds each key in turn for 10 frames, then releases everything for 20.
+    Enough to get most games past their title screen and moving.
+    """
+    if frame % 30 < 10:
+        return 1 << ((frame // 30) % 16)
+    return 0
+
+def run_frames(scheduler: Scheduler, cycles, input_script=None, after_frame=None):
+    """
+    Runs cycles instructions a frame at a time without sleeping,
+    setting the keys from input_script(frame) before each frame and calling after_frame() after each.
+    The timers tick after every full frame, a partial last frame leaves them as they are.
+    """
+    instructions_per_frame = scheduler.instructions_per_frame
+    while cycles > 0:
+        if input_script is not None:
+            set_keys(scheduler.chip8, input_script(scheduler.frames))
+        if cycles >= instructions_per_frame:
+            scheduler.run_frame()
+            if after_frame is not None:
+                after_frame()
+        else:
+            scheduler.engine.run(cycles)
+        cycles -= instructions_per_frame
+
+def timing(scheduler: Scheduler, cycles, elapsed):
+    """
+    The speed of cycles instructions run by scheduler in elapsed seconds, for the results of every runner.
+    Instructions skip_idle accounted for are counted in skipped, and cycles_per_second is executed ones only.
+    """
+    executed = cycles - scheduler.skipped
+    return {
+        'cycles': cycles,
+        'executed': executed,
+        'skipped': scheduler.skipped,
+        'seconds': elapsed,
+        'cycles_per_second': executed / elapsed if elapsed > 0 else float('inf')
+    }
+
+def run_headless(rom_name, cycles, engine='interpreter', input_script=None, seed=None,
+                 instructions_per_frame=INSTRUCTIONS_PER_FRAME, skip_idle=True, quirks=None, audio=None, rom_data=None):
+    """
+    Runs rom_name for cycles instructions as fast as possible,
+    with no display, sound or sleeping.
+
+    input_script(frame) returns the keys held during each frame as a 16 bit mask,
+    without one no keys are ever pressed.
+    seed makes the random numbers of _Cxkk, and so the final state, reproducible.
+    skip_idle fast forwards through key and delay waits, see timing for how the skipped instructions are counted.
+    quirks is the quirks profile to run with, see chip8.quirks.
+    audio is a WAV file name or file to render the buzzer of every full frame to.
+    rom_data is the contents of the rom when already read, rom_name is read otherwise.
+    """
+    chip8 = Chip8(rom_name, rom_data, seed=seed, quirks=quirks)
+    scheduler = Scheduler(chip8, create_engine(engine, chip8), instructions_per_frame, turbo=True, skip_idle=skip_idle)
+    after_frame = None
+    if audio is not None:
+        from chip8.sound import WavWriter
+        writer = WavWriter(audio)
+        after_frame = lambda: writer.write_frame(scheduler.sounding)
+
+    start = time.perf_counter()
+    run_frames(scheduler, cycles, input_script, after_frame)
+    elapsed = time.perf_counter() - start
+    if audio is not None:
+        writer.close()
+
+    return {
+        'rom': rom_name,
+        'engine': engine,
+        'frames': scheduler.frames,
+        **timing(scheduler, cycles, elapsed),
+        'hashes': state_hashes(chip8)
+    }
+
+def format_result(result):
+    hashes = ' '.join('%s=%s' % (part, digest[:12]) for part, digest in sorted(result['hashes'].items()))
+    return '%s: %d cycles, %d skipped as idle, in %.3fs (%.0f executed cycles/sec) %s' % (
+        result['rom'], result['cycles'], result['skipped'], result['seconds'], result['cycles_per_second'], hashes
+    )
@@ -0,0 +1,92 @@
+import struct
+from collections import deque
+
+CHUNK_SIZE = 64 #bytes compared at a time when diffing snapshots
+CHUNK_OFFSET = struct.Struct('<H')
+
+def diff_snapshots(keyframe, snapshot):
+    """
+    The chunks of snapshot that differ from keyframe,
+    each as a 2 byte offset followed by the chunk
+    """
+    changes = []
+    for offset in range(0, len(snapshot), CHUNK_SIZE):
+        chunk = snapshot[offset:offset + CHUNK_SIZE]
+        if chunk != keyframe[offset:offset + CHUNK_SIZE]:
+            changes.append(CHUNK_OFFSET.pack(offset))
+            changes.append(chunk)
+    return b''.join(changes)
+
+def apply_diff(keyframe, diff):
+    snapshot = bytearray(keyframe)
+    position = 0
+    while position < len(diff):
+        offset, = CHUNK_OFFSET.unpack_from(diff, position)
+        position += CHUNK_OFFSET.size
+        length = min(CHUNK_SIZE, len(snapshot) - offset)
+        snapshot[offset:offset + length] = diff[position:position + length]
+        position += length
+    return bytes(snapshot)
+
+class SnapshotHistory(object):
+    """
+    A bounded ring of Chip8 snapshots for rewinding.
+
+    Every keyframe_interval-th snapshot is kept whole as a keyframe, the ones in between only
+    keep the chunks that differ from their keyframe. Entries share their keyframe rather than
+    copying it, so a keyframe is freed once the last entry using it falls off the ring.
+    """
+    def __init__(self, capacity=600, keyframe_interval=60):
+        self.entries = deque(maxlen=capacity) #(keyframe, diff from it, None for the keyframe itself)
+        self.keyframe_interval = keyframe_interval
+        self.since_keyframe = 0
+        self.keyframe = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, chip8):
+        self.push(chip8.snapshot())
+
+    def push(self, snapshot):
+        if (self.keyframe is None or self.since_keyframe >= self.keyframe_interval
+                or len(snapshot) != len(self.keyframe)): #SUPER-CHIP resolution switches resize the display
+            self.keyframe = snapshot
+            self.since_keyframe = 0
+            self.entries.append((snapshot, None))
+        else:
+            self.entries.append((self.keyframe, diff_snapshots(self.keyframe, snapshot)))
+        self.since_keyframe += 1
+
+    def get(self, index):
+        """
+        The snapshot at index, negative indices count back from the most recent like a list
+        """
+        keyframe, diff = self.entries[index]
+        return keyframe if diff is None else apply_diff(keyframe, diff)
+
+    def rewind(self, chip8, steps=1):
+        """
+        Restores chip8 to the snapshot steps before the most recent one
+        and forgets everything newer, returns False if the history isn't that long
+        """
+        if steps >= len(self.entries):
+            return False
+        for _ in range(steps):
+            self.entries.pop()
+        chip8.restore(self.get(-1))
+        #keep diffing against the keyframe of what is now the most recent entry
+        self.keyframe = self.entries[-1][0]
+        self.since_keyframe = 0
+        for keyframe, _ in reversed(self.entries):
+            if keyframe is not self.keyframe:
+                break
+            self.since_keyframe += 1
+        return True
+
+    def memory_size(self):
+        """
+        Approximate bytes held by the history, every keyframe counted once
+        """
+        keyframes = {id(keyframe): len(keyframe) for keyframe, _ in self.entries}
+        return sum(keyframes.values()) + sum(len(diff) for _, diff in self.entries if diff is not None)
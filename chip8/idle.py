@@ -0,0 +1,63 @@
+"""
+Spots a Chip8 waiting on a key or the delay timer, so the instructions it would spin through
+until the next timer tick can be skipped instead of run.
+
+Keys only change and DT only ticks between frames, so within a frame these waits can't end:
+
+    Fx0A        with no key down, repeats itself without changing anything
+    1nnn        jumping to itself, same
+    Fx07        Vx = DT
+    3xkk        with DT != kk, never skips the jump
+    1nnn        back to the Fx07
+
+Skipping them leaves the machine in exactly the state running them would have.
+"""
+
+def is_delay_loop(memory, start):
+    """
+    Whether memory holds Fx07, 3xkk, 1nnn jumping back to start, at start
+    """
+    if start < 0 or start + 5 >= len(memory):
+        return False
+    return (memory[start] >> 4 == 0xF and memory[start + 1] == 0x07
+            and memory[start + 2] == 0x30 | (memory[start] & 0xF)
+            and memory[start + 4] == 0x10 | (start >> 8) and memory[start + 5] == start & 0xFF)
+
+def skip_idle(chip8, cycles):
+    """
+    Accounts for as many of the next cycles instructions as can be skipped without running them,
+    returns how many are left for the engine to run.
+
+    A wait entered part way through a delay loop is stepped to the top of the loop first with perform_cycle.
+    Most frames aren't waiting, so those are ruled out by the first nibble of the opcode alone.
+    """
+    memory = chip8.memory
+    address = chip8.program_counter
+    if address + 1 >= len(memory):
+        return cycles
+    family = memory[address] >> 4
+    if family == 0xF:
+        if memory[address + 1] == 0x0A:
+            return 0 if 1 not in chip8.keys else cycles
+        start = address
+    elif family == 0x3:
+        start = address - 2
+    elif family == 0x1:
+        if ((memory[address] & 0xF) << 8 | memory[address + 1]) == address:
+            return 0
+        start = address - 4
+    else:
+        return cycles
+    if not is_delay_loop(memory, start):
+        return cycles
+
+    while cycles and chip8.program_counter in (start + 2, start + 4):
+        chip8.perform_cycle()
+        cycles -= 1
+    if chip8.program_counter != start or chip8.DT == memory[start + 3]:
+        #out of the loop, or DT reaches kk and ends it this frame
+        return cycles
+    loops = cycles // 3
+    if loops:
+        chip8.registers[memory[start] & 0xF] = chip8.DT
+    return cycles - 3 * loops
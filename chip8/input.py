@@ -1,4 +1,4 @@
-import pygame, sys
+import pygame, sys, time
 from pygame.locals import *
 
 key_to_number = {
@@ -22,19 +22,108 @@ key_to_number = {
 }
 
 class Chip8Input(object): 
+    """
+    Collects key presses as they happen and hands them to the Scheduler once a frame, each placed
+    at the instruction of the frame matching when it happened, so taps shorter than a frame still
+    reach the game and presses aren't all bunched at the start of the frame.
 
-    def __init__(self, pygame):
+    Pass wait as the Scheduler's sleep, it waits on pygame events instead of sleeping so every
+    event is timestamped the moment it arrives, then key_changes as the before_frame hook.
+    """
+    def __init__(self, pygame, key_map=None, clock=time.perf_counter, quantize=False, allow_reset=True):
+        """
+        key_map maps pygame key names to chip 8 keys, the layout of key_to_number when not given.
+
+        quantize applies every change at the start of the frame, for recording input logs, which hold
+        one key mask per frame. A key released in the frame it was pressed is then held for that frame.
+
+        allow_reset lets SPACE reset the machine, turn it off while recording, as input logs can't hold resets.
+        """
         self.pygame = pygame
+        if key_map is None:
+            self.key_to_number = key_to_number
+        else:
+            self.key_to_number = {pygame.key.key_code(name): key for name, key in key_map.items()}
+        self.clock = clock
+        self.quantize = quantize
+        self.allow_reset = allow_reset
+        self.events = [] #(time, chip 8 key, pressed) since the last key_changes
+        self.deferred = [] #(chip 8 key, pressed) held over to the start of the next frame
+        self.reset_requested = False
+        self.last_poll = None
+
+    def handle_event(self, event, now):
+        pygame = self.pygame
+        if event.type == QUIT or event.type == pygame.KEYDOWN and event.key == K_ESCAPE:
+            pygame.quit()
+            sys.exit()
+        if self.allow_reset and event.type == pygame.KEYDOWN and event.key == K_SPACE:
+            self.reset_requested = True
+        if event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in self.key_to_number:
+            self.events.append((now, self.key_to_number[event.key], 1 if event.type == pygame.KEYDOWN else 0))
+
+    def poll(self):
+        for event in self.pygame.event.get():
+            self.handle_event(event, self.clock())
+
+    def wait(self, seconds):
+        """
+        Sleeps for seconds, timestamping every event that arrives in the meantime
+        """
+        deadline = self.clock() + seconds
+        while True:
+            remaining = deadline - self.clock()
+            if remaining < 0.001:
+                if remaining > 0:
+                    time.sleep(remaining)
+                return
+            event = self.pygame.event.wait(int(remaining * 1000))
+            if event.type != NOEVENT:
+                self.handle_event(event, self.clock())
+
+    def key_changes(self, chip8, instructions_per_frame):
+        """
+        The key changes to make during the next frame as (instruction, key, pressed), in order.
+
+        The events since the last call are spread over the frame in proportion to when they arrived
+        between the two calls. A key never changes twice at the same instruction, so a release never
+        cancels the press before it unseen, a change that would has to wait for the next instruction,
+        or the next frame, along with every later change to that key.
+        """
+        self.poll()
+        now = self.clock()
+        start = self.last_poll if self.last_poll is not None else now
+        self.last_poll = now
+        if self.reset_requested:
+            self.reset_requested = False
+            chip8.reset()
 
-    def handle_input(self, chip8):
-        for event in pygame.event.get():
-            if event.type == QUIT or event.type == pygame.KEYDOWN and event.key == K_ESCAPE:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN and event.key == event.key == K_SPACE:
-                chip8.reset()
-            if event.type == pygame.KEYDOWN and event.key in key_to_number:
-                chip8.keys[key_to_number[event.key]] = 1
-            if event.type == pygame.KEYUP and event.key in key_to_number:
-                chip8.keys[key_to_number[event.key]] = 0
-    
\ No newline at end of file
+        #changes held over from the last frame go first, at its start
+        events = [(None, key, pressed) for key, pressed in self.deferred] + self.events
+        self.deferred = []
+        changes = []
+        changed_at = {} #instruction each key last changed at
+        last = 0 if self.quantize else instructions_per_frame - 1
+        for event_time, key, pressed in events:
+            if any(deferred_key == key for deferred_key, _ in self.deferred):
+                #a later change to a key can't overtake one held over for the next frame
+                self.deferred.append((key, pressed))
+                continue
+            instruction = 0
+            if event_time is not None and now > start and not self.quantize:
+                instruction = min(last, max(0, int((event_time - start) / (now - start) * instructions_per_frame)))
+            instruction = max(instruction, changes[-1][0] if changes else 0) #never before an earlier event
+            if key in changed_at and instruction <= changed_at[key]:
+                instruction = changed_at[key] + 1
+                if instruction > last:
+                    self.deferred.append((key, pressed))
+                    continue
+            changed_at[key] = instruction
+            changes.append((instruction, key, pressed))
+        self.events = []
+        if self.quantize:
+            #all at the start of the frame, so the keys are set now and the recorder sees them
+            for _, key, pressed in changes:
+                chip8.keys[key] = pressed
+            return []
+        return changes
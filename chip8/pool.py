@@ -0,0 +1,114 @@
+"""
+Runs many chip 8 jobs across a pool of worker processes.
+
+ex. python -m chip8.pool roms/PONG roms/TETRIS --seeds 100 --cycles 50000
+"""
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chip8.chip8 import Chip8, read_rom
+from chip8.engines import ENGINES, create_engine
+from chip8.headless import run_frames, state_hashes, timing
+from chip8.scheduler import Scheduler
+
+#input_script is None for no input, a picklable function of the frame returning the key mask,
+#or a sequence with the key mask of each frame
+Job = namedtuple('Job', ['rom_name', 'input_script', 'cycles', 'seed'])
+
+#rom contents by rom name, sent once to each worker when it starts
+_worker_roms = {}
+
+def _init_worker(roms):
+    _worker_roms.update(roms)
+
+def _frame_masks(masks):
+    def input_script(frame):
+        return masks[frame] if frame < len(masks) else 0
+    return input_script
+
+def run_job(job: Job, engine='interpreter', rom_data=None):
+    """
+    Runs a single job in this process,
+    returns the final display, registers, hashes and timing of the machine, see headless.timing.
+    """
+    if rom_data is None:
+        rom_data = _worker_roms.get(job.rom_name)
+    chip8 = Chip8(job.rom_name, rom_data, seed=job.seed)
+    scheduler = Scheduler(chip8, create_engine(engine, chip8), turbo=True)
+
+    input_script = job.input_script
+    if input_script is not None and not callable(input_script):
+        input_script = _frame_masks(input_script)
+
+    start = time.perf_counter()
+    run_frames(scheduler, job.cycles, input_script)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'rom': job.rom_name,
+        'seed': job.seed,
+        **timing(scheduler, job.cycles, elapsed),
+        'program_counter': chip8.program_counter,
+        'I': chip8.I,
+        'DT': chip8.DT,
+        'ST': chip8.ST,
+        'registers': list(chip8.registers),
+        'stack': list(chip8.stack[:chip8.stack_pointer]),
+        'display': chip8.display_buffer(),
+        'hashes': state_hashes(chip8)
+    }
+
+def _run_job(index, job, engine):
+    try:
+        result = run_job(job, engine)
+    except Exception as error:
+        result = {'rom': job.rom_name, 'seed': job.seed, 'error': '%s: %s' % (type(error).__name__, error)}
+    result['job'] = index
+    return result
+
+def run_jobs(jobs, workers=None, engine='interpreter'):
+    """
+    Runs every job on a pool of workers processes, one per cpu by default.
+
+    Each rom is read once here and handed to every worker when it starts,
+    so jobs never touch the disk. Results are yielded as soon as each job finishes,
+    result['job'] is the index of the job it belongs to.
+    """
+    jobs = list(jobs)
+    roms = {}
+    for job in jobs:
+        if job.rom_name not in roms:
+            roms[job.rom_name] = read_rom(job.rom_name)
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(roms,)) as executor:
+        futures = [executor.submit(_run_job, index, job, engine) for index, job in enumerate(jobs)]
+        for future in as_completed(futures):
+            yield future.result()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run chip 8 roms over many seeds on a pool of processes')
+    parser.add_argument('roms', nargs='+', metavar='rom')
+    parser.add_argument('--seeds', type=int, default=1, help='number of seeds to run each rom with, 0 to seeds-1')
+    parser.add_argument('--cycles', type=int, default=100000, help='instructions to run each job for')
+    parser.add_argument('--workers', type=int, help='worker processes, default one per cpu')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='interpreter')
+    args = parser.parse_args(argv)
+
+    jobs = [Job(rom, None, args.cycles, seed) for rom in args.roms for seed in range(args.seeds)]
+    executed = 0
+    start = time.perf_counter()
+    for result in run_jobs(jobs, args.workers, args.engine):
+        result.pop('display', None)
+        executed += result.get('executed', 0)
+        print(json.dumps(result, sort_keys=True), flush=True)
+    elapsed = time.perf_counter() - start
+    print('%d jobs, %d instructions in %.2fs (%.0f executed instructions/sec across %d workers)' % (
+        len(jobs), len(jobs) * args.cycles, elapsed, executed / elapsed, args.workers or os.cpu_count()
+    ))
+
+if __name__ == '__main__':
+    main()
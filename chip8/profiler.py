@@ -0,0 +1,192 @@
+"""
+Counts and times every instruction a Chip8 runs, per handler and per address.
+
+ex. python -m chip8.profiler roms/INVADERS --frames 3600 --collapsed invaders.folded
+
+The collapsed file has one line per call stack and instruction with the nanoseconds spent in it,
+ready for flamegraph.pl or speedscope.
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+
+from chip8.analysis import analyze_rom
+from chip8.chip8 import Chip8, _Dxy0, _Dxyn, _Dxyn_wrap, install_hook, remove_hook
+from chip8.engines import Interpreter
+from chip8.headless import demo_input, set_keys
+from chip8.scheduler import INSTRUCTIONS_PER_FRAME, Scheduler
+
+class Profiler(object):
+    """
+    Instruments chip8 while attached, by wrapping whatever perform_cycle and update_timers it has
+    with timed versions on the instance. Detached, what was there is put back untouched, so a
+    machine that isn't being profiled pays nothing, not even a check per cycle, and other hooks
+    like the Tracer can be attached and detached around it in any order.
+
+    Only instructions run through perform_cycle are seen, so profile with the interpreter engine.
+    With a RomAnalysis of the rom the report names the routine each hot address is in.
+    """
+    def __init__(self, chip8: Chip8, analysis=None):
+        self.chip8 = chip8
+        self.analysis = analysis
+        self.attached = False
+        self.clear()
+
+    def clear(self):
+        self.handler_counts = defaultdict(int)
+        self.handler_seconds = defaultdict(float)
+        self.address_counts = [0] * 4096
+        self.address_seconds = [0.0] * 4096
+        self.stack_seconds = defaultdict(float) #(call sites on the stack, address, handler name): seconds
+        self.frames = [] #[sprite draws, display presents] per frame
+        self.frame_draws = 0
+
+    def attach(self):
+        if self.attached:
+            return self
+        chip8 = self.chip8
+        perf_counter = time.perf_counter
+        previous_perform_cycle = chip8.perform_cycle
+        update_timers = chip8.update_timers
+
+        def perform_cycle():
+            if perform_cycle.removed:
+                #detached while hooked in below another, pass straight through
+                return previous_perform_cycle()
+            address = chip8.program_counter
+            instruction = chip8.decode_cache[address]
+            if instruction is None:
+                instruction = chip8.decode_instruction(address)
+            handler = instruction.func
+            stack = tuple(chip8.stack[:chip8.stack_pointer])
+            start = perf_counter()
+            previous_perform_cycle()
+            elapsed = perf_counter() - start
+
+            self.handler_counts[handler.__name__] += 1
+            self.handler_seconds[handler.__name__] += elapsed
+            self.address_counts[address] += 1
+            self.address_seconds[address] += elapsed
+            self.stack_seconds[stack, address, handler.__name__] += elapsed
+            if handler is _Dxyn or handler is _Dxyn_wrap or handler is _Dxy0:
+                self.frame_draws += 1
+
+        def profiled_update_timers():
+            update_timers()
+            if profiled_update_timers.removed:
+                return
+            self.frames.append([self.frame_draws, 0])
+            self.frame_draws = 0
+
+        self.hooks = {'perform_cycle': perform_cycle, 'update_timers': profiled_update_timers}
+        for name, hook in self.hooks.items():
+            install_hook(chip8, name, hook)
+        self.attached = True
+        return self
+
+    def detach(self):
+        if self.attached:
+            self.attached = False
+            for name, hook in self.hooks.items():
+                remove_hook(self.chip8, name, hook)
+
+    def __enter__(self):
+        return self.attach()
+
+    def __exit__(self, *exc_info):
+        self.detach()
+
+    def wrap_present(self, present):
+        """
+        present, counting every call as a display present of the frame that just ran
+        """
+        def profiled_present():
+            if self.frames:
+                self.frames[-1][1] += 1
+            present()
+        return profiled_present
+
+    def report(self, top=20):
+        """
+        Text report of the handlers and addresses that took the most time, and draws and presents per frame
+        """
+        total_count = sum(self.handler_counts.values())
+        total_seconds = sum(self.handler_seconds.values()) or float('inf')
+        lines = ['%s: %d instructions in %.3fs' % (self.chip8.rom_name, total_count, sum(self.handler_seconds.values())), '']
+
+        lines.append('%-8s %12s %10s %9s %7s' % ('handler', 'count', 'ms', 'ns/call', 'time%'))
+        for name in sorted(self.handler_seconds, key=self.handler_seconds.get, reverse=True)[:top]:
+            count, seconds = self.handler_counts[name], self.handler_seconds[name]
+            lines.append('%-8s %12d %10.2f %9.0f %6.1f%%' % (
+                name, count, seconds * 1e3, seconds * 1e9 / count, 100 * seconds / total_seconds
+            ))
+        lines.append('')
+
+        lines.append('%-8s %-8s %12s %10s %7s  %s' % ('address', 'opcode', 'count', 'ms', 'time%', 'routine'))
+        addresses = sorted(range(4096), key=self.address_seconds.__getitem__, reverse=True)
+        for address in addresses[:top]:
+            if not self.address_counts[address]:
+                break
+            opcode = (self.chip8.memory[address] << 8) | self.chip8.memory[(address + 1) % 4096]
+            routine = self.analysis.locate(address) if self.analysis is not None else None
+            lines.append('0x%03X    %04X     %12d %10.2f %6.1f%%  %s' % (
+                address, opcode, self.address_counts[address], self.address_seconds[address] * 1e3,
+                100 * self.address_seconds[address] / total_seconds, routine or ''
+            ))
+
+        if self.frames:
+            draws = [frame[0] for frame in self.frames]
+            presents = [frame[1] for frame in self.frames]
+            lines.append('')
+            lines.append('%d frames, sprite draws per frame %.2f avg %d max, presents per frame %.2f avg' % (
+                len(self.frames), sum(draws) / len(draws), max(draws), sum(presents) / len(presents)
+            ))
+        return '\n'.join(lines)
+
+    def collapsed_stacks(self):
+        """
+        Lines of 'rom;sub_XXX;...;XXX handler nanoseconds', one per call stack and instruction.
+        Each sub_XXX is a subroutine on the stack, found from the CALL before its return address.
+        """
+        memory = self.chip8.memory
+        root = os.path.basename(self.chip8.rom_name)
+
+        def subroutine(return_address):
+            call = return_address % 4096
+            return 'sub_%03X' % (((memory[call] << 8) | memory[(call + 1) % 4096]) & 0x0FFF)
+
+        lines = []
+        for (stack, address, name), seconds in sorted(self.stack_seconds.items()):
+            nanoseconds = int(seconds * 1e9)
+            if nanoseconds:
+                frames = [root] + [subroutine(return_address) for return_address in stack]
+                frames.append('%03X %s' % (address, name))
+                lines.append('%s %d' % (';'.join(frames), nanoseconds))
+        return '\n'.join(lines) + '\n'
+
+def profile_rom(rom_name, frames, input_script=demo_input, seed=0, instructions_per_frame=INSTRUCTIONS_PER_FRAME):
+    chip8 = Chip8(rom_name, seed=seed)
+    scheduler = Scheduler(chip8, Interpreter(chip8), instructions_per_frame, turbo=True, skip_idle=False)
+    with Profiler(chip8, analyze_rom(chip8.rom_data, chip8.quirks)) as profiler:
+        for frame in range(frames):
+            set_keys(chip8, input_script(frame))
+            scheduler.run_frame()
+    return profiler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile which instructions and addresses of a chip 8 rom take the most time')
+    parser.add_argument('rom')
+    parser.add_argument('--frames', type=int, default=1800, help='60HZ frames to run the rom for, with scripted input')
+    parser.add_argument('--top', type=int, default=20, help='handlers and addresses to list in the report')
+    parser.add_argument('--collapsed', help='file to write collapsed stacks to, for flame graphs')
+    args = parser.parse_args(argv)
+
+    profiler = profile_rom(args.rom, args.frames)
+    print(profiler.report(args.top))
+    if args.collapsed:
+        with open(args.collapsed, 'w') as output:
+            output.write(profiler.collapsed_stacks())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+The instructions chip 8 interpreters disagree on, and the way each well known interpreter runs them.
+
+Games are written for one interpreter and often break on the others, so pick the profile
+a rom was written for, see roms.RomCatalog for setting it per rom.
+"""
+from collections import namedtuple
+
+#shift_vy        8xy6 and 8xyE shift Vy into Vx, instead of shifting Vx in place
+#load_store      how Fx55 and Fx65 leave I, 'increment' adds x + 1, 'increment_x' adds x, 'unchanged' leaves it
+#jump_vx         Bnnn jumps to nnn + Vx where x is the top nibble of nnn, instead of nnn + V0
+#wrap_sprites    sprites drawn past the edge of the screen wrap to the other side, instead of being clipped
+#logic_reset_vf  8xy1, 8xy2 and 8xy3 set VF to 0
+#extended        SUPER-CHIP's instructions, the 128x64 display, scrolling, 16x16 sprites and the big font
+Quirks = namedtuple('Quirks', ['shift_vy', 'load_store', 'jump_vx', 'wrap_sprites', 'logic_reset_vf', 'extended'])
+
+LOAD_STORE_MODES = ('increment', 'increment_x', 'unchanged')
+
+QUIRKS_PROFILES = {
+    'default': Quirks(shift_vy=False, load_store='increment', jump_vx=False, wrap_sprites=False, logic_reset_vf=False, extended=False),
+    'cosmac': Quirks(shift_vy=True, load_store='increment', jump_vx=False, wrap_sprites=False, logic_reset_vf=True, extended=False),
+    'chip48': Quirks(shift_vy=False, load_store='increment_x', jump_vx=True, wrap_sprites=False, logic_reset_vf=False, extended=False),
+    'schip': Quirks(shift_vy=False, load_store='unchanged', jump_vx=True, wrap_sprites=False, logic_reset_vf=False, extended=True),
+}
+
+def get_quirks(quirks):
+    """
+    quirks as a Quirks, looking it up in QUIRKS_PROFILES when it is a name and using 'default' when None
+    """
+    if quirks is None:
+        return QUIRKS_PROFILES['default']
+    if isinstance(quirks, str):
+        if quirks not in QUIRKS_PROFILES:
+            raise ValueError('Unknown quirks profile %r, expected one of %s' % (quirks, ', '.join(sorted(QUIRKS_PROFILES))))
+        return QUIRKS_PROFILES[quirks]
+    if quirks.load_store not in LOAD_STORE_MODES:
+        raise ValueError('Unknown load_store quirk %r, expected one of %s' % (quirks.load_store, ', '.join(LOAD_STORE_MODES)))
+    return quirks
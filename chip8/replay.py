@@ -0,0 +1,122 @@
+"""
+Records the keys held during every frame so a game can be replayed exactly.
+
+A log starts with a header holding the random seed, instructions per frame and quirks the game ran with,
+followed by runs of (number of frames, 16 bit key mask) so held keys and idle stretches cost
+4 bytes however long they last.
+"""
+import struct
+import time
+
+from chip8.chip8 import Chip8
+from chip8.engines import create_engine
+from chip8.headless import set_keys, state_hashes, timing
+from chip8.quirks import LOAD_STORE_MODES, Quirks, get_quirks
+from chip8.scheduler import Scheduler
+
+MAGIC = b'C8IN'
+VERSION = 2
+HEADER = struct.Struct('<4sBQHBB') #magic, version, seed, instructions per frame, quirk flags, load_store mode
+RUN = struct.Struct('<HH') #frames, key mask
+MAX_RUN = 0xFFFF
+QUIRK_FLAGS = ('shift_vy', 'jump_vx', 'wrap_sprites', 'logic_reset_vf', 'extended') #bit 0 up
+
+def pack_quirks(quirks):
+    """
+    quirks as (flags, load_store mode) for the header, so logs of custom quirks replay too, not just the profiles
+    """
+    quirks = get_quirks(quirks)
+    flags = 0
+    for bit, name in enumerate(QUIRK_FLAGS):
+        flags |= bool(getattr(quirks, name)) << bit
+    return flags, LOAD_STORE_MODES.index(quirks.load_store)
+
+def unpack_quirks(flags, load_store):
+    if load_store >= len(LOAD_STORE_MODES):
+        raise ValueError('Unknown load_store mode %d in input log' % load_store)
+    values = {name: bool((flags >> bit) & 1) for bit, name in enumerate(QUIRK_FLAGS)}
+    return Quirks(load_store=LOAD_STORE_MODES[load_store], **values)
+
+class InputRecorder(object):
+    """
+    Writes an input log to a binary file, call record once before every frame
+    and close when done
+    """
+    def __init__(self, file, seed, instructions_per_frame, quirks=None):
+        self.file = file
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, instructions_per_frame, *pack_quirks(quirks)))
+        self.mask = None
+        self.frames = 0 #frames in the run not written yet
+
+    def record(self, mask):
+        if mask == self.mask and self.frames < MAX_RUN:
+            self.frames += 1
+            return
+        self.flush_run()
+        self.mask = mask
+        self.frames = 1
+
+    def flush_run(self):
+        if self.frames:
+            self.file.write(RUN.pack(self.frames, self.mask))
+            self.frames = 0
+
+    def close(self):
+        self.flush_run()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class InputReplayer(object):
+    """
+    Streams the key mask of every frame back out of an input log,
+    reading one run at a time rather than the whole file
+    """
+    def __init__(self, file):
+        self.file = file
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError('Not an input log, too short for the header')
+        magic, version, self.seed, self.instructions_per_frame, flags, load_store = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('Not an input log, bad magic %r' % magic)
+        if version != VERSION:
+            raise ValueError('Unsupported input log version %d' % version)
+        self.quirks = unpack_quirks(flags, load_store)
+
+    def __iter__(self):
+        while True:
+            run = self.file.read(RUN.size)
+            if len(run) < RUN.size:
+                return
+            frames, mask = RUN.unpack(run)
+            for _ in range(frames):
+                yield mask
+
+def replay(rom_name, log_file, engine='interpreter'):
+    """
+    Replays the input log in log_file on rom_name as fast as possible,
+    returns the speed and final state hashes like run_headless
+    """
+    replayer = InputReplayer(log_file)
+    chip8 = Chip8(rom_name, seed=replayer.seed, quirks=replayer.quirks)
+    scheduler = Scheduler(chip8, create_engine(engine, chip8), replayer.instructions_per_frame, turbo=True)
+
+    start = time.perf_counter()
+    for mask in replayer:
+        set_keys(chip8, mask)
+        scheduler.run_frame()
+    elapsed = time.perf_counter() - start
+
+    cycles = scheduler.frames * scheduler.instructions_per_frame
+    return {
+        'rom': rom_name,
+        'engine': engine,
+        'frames': scheduler.frames,
+        **timing(scheduler, cycles, elapsed),
+        'hashes': state_hashes(chip8)
+    }
@@ -0,0 +1,108 @@
+"""
+A catalog of the roms in a directory, indexed by the SHA-1 of their contents.
+
+Each rom is read once, its bytes are kept in the catalog, and every Chip8 it creates reuses them,
+so resets and pool workers never go back to the disk.
+
+Per rom metadata comes from an optional catalog.json in the directory, keyed by file name or SHA-1:
+
+    {
+        "PONG": {"quirks": "default", "keys": {"1": 1, "q": 4}},
+        "0123abcd...": {"quirks": "schip"}
+    }
+"""
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+from chip8.chip8 import Chip8, read_rom
+
+METADATA_FILE = 'catalog.json'
+DEFAULT_QUIRKS = 'default'
+
+#the keyboard key held for each chip 8 key, 1234/QWER/ASDF/ZXCV laid out like the COSMAC VIP keypad
+DEFAULT_KEY_MAP = {
+    'x': 0x0, '1': 0x1, '2': 0x2, '3': 0x3,
+    'q': 0x4, 'w': 0x5, 'e': 0x6, 'a': 0x7,
+    's': 0x8, 'd': 0x9, 'z': 0xA, 'c': 0xB,
+    '4': 0xC, 'r': 0xD, 'f': 0xE, 'v': 0xF
+}
+
+RomInfo = namedtuple('RomInfo', ['sha1', 'name', 'path', 'size', 'quirks', 'key_map'])
+
+def load_metadata(directory):
+    path = os.path.join(directory, METADATA_FILE)
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def describe_rom(path, data=None, metadata=None):
+    """
+    The RomInfo of the rom at path, with metadata from the catalog.json next to it when not given
+    """
+    if data is None:
+        data = read_rom(path)
+    if metadata is None:
+        metadata = load_metadata(os.path.dirname(path) or '.')
+    sha1 = hashlib.sha1(data).hexdigest()
+    name = os.path.basename(path)
+    entry = metadata.get(sha1, metadata.get(name, {}))
+    return RomInfo(
+        sha1, name, path, len(data),
+        entry.get('quirks', DEFAULT_QUIRKS),
+        dict(entry.get('keys', DEFAULT_KEY_MAP))
+    )
+
+class RomCatalog(object):
+    """
+    Every rom in directory, looked up by SHA-1, a unique prefix of one, or file name
+    """
+    def __init__(self, directory='roms'):
+        self.directory = directory
+        self.metadata = load_metadata(directory)
+        self.roms = {} #RomInfo by SHA-1
+        self.rom_bytes = {} #rom contents by SHA-1
+        self.names = {} #SHA-1 by file name
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name != METADATA_FILE and not name.startswith('.') and os.path.isfile(path):
+                self.add(path)
+
+    def add(self, path):
+        data = read_rom(path)
+        info = describe_rom(path, data, self.metadata)
+        self.roms[info.sha1] = info
+        self.rom_bytes[info.sha1] = data
+        self.names[info.name] = info.sha1
+        return info
+
+    def __len__(self):
+        return len(self.roms)
+
+    def __iter__(self):
+        return iter(self.roms.values())
+
+    def get(self, key):
+        if key in self.roms:
+            return self.roms[key]
+        if key in self.names:
+            return self.roms[self.names[key]]
+        matches = [sha1 for sha1 in self.roms if sha1.startswith(key.lower())] if key else []
+        if len(matches) == 1:
+            return self.roms[matches[0]]
+        if matches:
+            raise KeyError('%r matches %d roms' % (key, len(matches)))
+        raise KeyError('No rom %r in %s' % (key, self.directory))
+
+    def data(self, key):
+        return self.rom_bytes[self.get(key).sha1]
+
+    def create(self, key, **options):
+        """
+        A Chip8 running the rom key from the cached bytes with its quirks, options are passed on to Chip8
+        """
+        info = self.get(key)
+        options.setdefault('quirks', info.quirks)
+        return Chip8(info.path, self.rom_bytes[info.sha1], **options)
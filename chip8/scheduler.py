@@ -0,0 +1,111 @@
+import time
+
+from chip8.idle import skip_idle
+
+TIMER_HZ = 60 #DT and ST count down at 60HZ, and games expect the screen to refresh at the same rate
+INSTRUCTIONS_PER_FRAME = 14 #about 840 instructions a second, the speed main.py always ran at
+MAX_LAG = 0.25 #seconds behind schedule before giving up on catching up
+
+class Scheduler(object):
+    """
+    Runs a Chip8 a 60HZ frame at a time.
+
+    Every frame executes instructions_per_frame instructions then ticks DT and ST once,
+    so the timers count at 60HZ no matter how fast the host or the engine is.
+    Frames are paced with time.perf_counter against an absolute schedule, so sleeping
+    late on one frame is made up on the next instead of drifting.
+
+    speed scales the frame rate, 10 runs the game 10 times faster with its timing intact.
+    turbo runs frames back to back without sleeping.
+    skip_idle skips the rest of a frame spent waiting on a key or the delay timer, see chip8.idle.
+    """
+    def __init__(self, chip8, engine, instructions_per_frame=INSTRUCTIONS_PER_FRAME,
+                 speed=1.0, turbo=False, clock=time.perf_counter, sleep=time.sleep, skip_idle=True):
+        self.chip8 = chip8
+        self.engine = engine
+        self.instructions_per_frame = instructions_per_frame
+        self.frame_period = 1 / (TIMER_HZ * speed)
+        self.turbo = turbo
+        self.clock = clock
+        self.sleep = sleep
+        self.skip_idle = skip_idle
+
+        self.frames = 0
+        self.skipped = 0 #instructions accounted for by skip_idle without being run
+        self.sounding = False #whether ST was nonzero through the last frame, so the buzzer played
+        self.next_frame = None #clock time the next frame is due
+        self.last_present = None
+
+    def run_frame(self, key_changes=None):
+        """
+        Runs one frame, key_changes are (instruction, key, pressed) in order, each made
+        just before that instruction of the frame runs
+        """
+        done = 0
+        if key_changes:
+            keys = self.chip8.keys
+            for instruction, key, pressed in key_changes:
+                if instruction > done:
+                    self.run_instructions(instruction - done)
+                    done = instruction
+                keys[key] = pressed
+        self.run_instructions(self.instructions_per_frame - done)
+        self.sounding = self.chip8.ST > 0
+        self.chip8.update_timers()
+        self.frames += 1
+
+    def run_instructions(self, cycles):
+        if self.skip_idle:
+            #keys only change between calls, so a wait can be skipped up to the next change
+            left = skip_idle(self.chip8, cycles)
+            self.skipped += cycles - left
+            cycles = left
+        self.engine.run(cycles)
+
+    def wait_for_frame(self):
+        """
+        Sleeps until the next frame is due, never sleeps in turbo mode
+        """
+        if self.turbo:
+            return
+        now = self.clock()
+        if self.next_frame is None:
+            self.next_frame = now
+        self.next_frame += self.frame_period
+        delay = self.next_frame - now
+        if delay > 0:
+            self.sleep(delay)
+        elif delay < -MAX_LAG:
+            #the host can't keep up, carry on from now rather than rushing through the backlog
+            self.next_frame = now
+
+    def present_due(self):
+        """
+        Whether a vblank has passed since the last present, so the display is drawn at most
+        60 times a second however fast frames run. Allows a little jitter so running at normal
+        speed presents every frame.
+        """
+        now = self.clock()
+        if self.last_present is not None and now - self.last_present < 0.9 / TIMER_HZ:
+            return False
+        self.last_present = now
+        return True
+
+    def run(self, frames=None, before_frame=None, after_frame=None, present=None):
+        """
+        Runs frames frames, or forever when None.
+
+        before_frame() is called before every frame, for input, and can return key changes for run_frame.
+        after_frame() is called after every frame, for sound.
+        present() is called after a frame at most once per vblank, for drawing.
+        """
+        while frames is None or frames > 0:
+            key_changes = before_frame() if before_frame is not None else None
+            self.run_frame(key_changes)
+            if after_frame is not None:
+                after_frame()
+            if present is not None and self.present_due():
+                present()
+            self.wait_for_frame()
+            if frames is not None:
+                frames -= 1
@@ -1,12 +1,123 @@
-import pygame, sys
-from pygame.locals import *
+"""
+The chip 8 buzzer, a square wave that sounds for as long as ST is nonzero.
+
+The tone is synthesized a 60HZ frame at a time into a preallocated buffer, then either streamed
+through pygame.mixer by Chip8Sound or written to a WAV file by WavWriter, for checking the sound
+of a headless run.
+"""
+import math
+import sys
+import wave
+from array import array
+
+from chip8.scheduler import TIMER_HZ
+
+SAMPLE_RATE = 44100
+TONE_FREQUENCY = 440
+VOLUME = 0.25 #of full scale, square waves are loud
+
+class ToneGenerator(object):
+    """
+    Renders a frame of 16 bit samples at a time, the square wave while sounding and silence otherwise.
+
+    Every sample of the wave is read from a table one repeat of the wave long, so a frame is
+    a single slice copy, and the wave carries on where the last frame left off instead of clicking.
+    """
+    def __init__(self, sample_rate=SAMPLE_RATE, frequency=TONE_FREQUENCY, volume=VOLUME, channels=1):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.samples_per_frame = sample_rate // TIMER_HZ
+        self.buffer = array('h', bytes(2 * self.samples_per_frame * channels))
+        self.silence = array('h', bytes(2 * len(self.buffer)))
+
+        #the wave repeats exactly every sample_rate / gcd(sample_rate, frequency) samples
+        repeat = sample_rate // math.gcd(sample_rate, frequency)
+        amplitude = int(32767 * volume)
+        samples = [amplitude if (index * frequency) % sample_rate < sample_rate // 2 else -amplitude for index in range(repeat)]
+        tone = array('h', [sample for sample in samples for _ in range(channels)])
+        while len(tone) < len(self.buffer) + repeat * channels:
+            tone.extend(tone[:repeat * channels])
+        self.tone = tone
+        self.repeat = repeat
+        self.position = 0 #sample of the wave the next frame starts at
+        self.sounding = False
+
+    def render(self, sounding):
+        """
+        The samples of the next frame, in buffer, which is overwritten by the next render
+        """
+        if sounding:
+            start = self.position * self.channels
+            self.buffer[:] = self.tone[start:start + len(self.buffer)]
+            self.position = (self.position + self.samples_per_frame) % self.repeat
+        elif self.sounding:
+            self.buffer[:] = self.silence
+            self.position = 0
+        self.sounding = sounding
+        return self.buffer
 
 class Chip8Sound(object):
-    def __init__(self, pygame):
+    """
+    Streams the tone through pygame.mixer a frame at a time, call play after every frame.
+
+    A mixer channel plays one sound and holds one more in its queue, so at most two frames,
+    about 33ms, are ever waiting to be heard. Frames that would queue more, when the emulator runs
+    faster than 60HZ, are dropped rather than falling further and further behind.
+    """
+    def __init__(self, pygame, frequency=TONE_FREQUENCY, volume=VOLUME):
         self.pygame = pygame
-        self.effect = pygame.mixer.Sound('buzz.wav')
-    
+        sample_rate, size, channels = pygame.mixer.get_init()
+        if size != -16:
+            raise ValueError('Chip8Sound needs 16 bit signed samples, the mixer has %d' % size)
+        self.generator = ToneGenerator(sample_rate, frequency, volume, channels)
+        #one playing, one queued and one to render into, so a sound is never written while it is heard
+        self.sounds = [pygame.mixer.Sound(buffer=bytes(2 * len(self.generator.buffer))) for _ in range(3)]
+        self.views = [memoryview(sound).cast('B').cast('h') for sound in self.sounds]
+        self.next_sound = 0
+        self.channel = pygame.mixer.Channel(0)
+
+    def play(self, sounding):
+        """
+        Streams the next frame of audio, sounding is whether ST was nonzero through the frame
+        """
+        if not sounding:
+            self.generator.render(False)
+            return
+        channel = self.channel
+        busy = channel.get_busy()
+        if busy and channel.get_queue() is not None:
+            return
+        self.views[self.next_sound][:] = self.generator.render(True)
+        sound = self.sounds[self.next_sound]
+        self.next_sound = (self.next_sound + 1) % len(self.sounds)
+        if busy:
+            channel.queue(sound)
+        else:
+            channel.play(sound)
+
+class WavWriter(object):
+    """
+    Writes the tone of every frame to a mono 16 bit WAV file, call write_frame after every frame and close when done
+    """
+    def __init__(self, file, sample_rate=SAMPLE_RATE, frequency=TONE_FREQUENCY, volume=VOLUME):
+        self.generator = ToneGenerator(sample_rate, frequency, volume)
+        self.wav = wave.open(file, 'wb')
+        self.wav.setnchannels(1)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(sample_rate)
+
+    def write_frame(self, sounding):
+        samples = self.generator.render(sounding)
+        if sys.byteorder == 'big':
+            samples = array('h', samples)
+            samples.byteswap() #WAV samples are little endian
+        self.wav.writeframesraw(samples)
+
+    def close(self):
+        self.wav.close()
+
+    def __enter__(self):
+        return self
 
-    def play(self, chip8):
-        if chip8.ST == 1:
-            self.effect.play()
+    def __exit__(self, *exc_info):
+        self.close()
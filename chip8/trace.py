@@ -0,0 +1,215 @@
+"""
+Traces every instruction a Chip8 runs into a preallocated binary ring buffer, for finding where
+two engines or quirk modes part ways without formatting a line of text per cycle.
+
+ex. python -m chip8.trace record roms/INVADERS --frames 600 --output invaders.trace
+    python -m chip8.trace view invaders.trace --start 1000 --count 50
+
+A trace file is a header followed by fixed size records of
+(cycle, PC, opcode, I, mask of the registers the instruction changed, lowest changed register, its new value).
+"""
+import argparse
+import struct
+
+from chip8.analysis import disassemble
+from chip8.chip8 import Chip8, install_hook, remove_hook
+from chip8.engines import Interpreter
+from chip8.headless import demo_input, set_keys
+from chip8.scheduler import INSTRUCTIONS_PER_FRAME, Scheduler
+
+MAGIC = b'C8TR'
+VERSION = 1
+HEADER = struct.Struct('<4sBB?') #magic, version, record size, SUPER-CHIP instructions decoded
+RECORD = struct.Struct('<QHHHHBB') #cycle, PC, opcode, I, changed registers mask, lowest changed register, its value
+NO_REGISTER = 0xFF
+DEFAULT_CAPACITY = 1 << 16 #records held in memory before the oldest are flushed or overwritten
+
+class Tracer(object):
+    """
+    Records every instruction chip8 runs while attached, by wrapping whatever perform_cycle it has on
+    the instance like the Profiler, so a machine that isn't traced pays nothing and the two can be
+    attached together.
+
+    Records are packed straight into a buffer of capacity records. With a file, a full buffer is written
+    to it in one go and reused, without one the buffer is a ring holding the last capacity records.
+
+    Only instructions run through perform_cycle are seen, so trace with the interpreter engine.
+    """
+    def __init__(self, chip8: Chip8, capacity=DEFAULT_CAPACITY, file=None):
+        self.chip8 = chip8
+        self.capacity = capacity
+        self.file = file
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.count = 0 #records in the buffer
+        self.position = 0 #next record to write in the buffer
+        self.cycle = 0 #instructions run since attaching
+        self.attached = False
+        if file is not None:
+            file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, chip8.quirks.extended))
+
+    def attach(self):
+        if self.attached:
+            return self
+        chip8 = self.chip8
+        buffer = self.buffer
+        pack_into = RECORD.pack_into
+        record_size = RECORD.size
+        previous = chip8.perform_cycle
+
+        def perform_cycle():
+            if perform_cycle.removed:
+                #detached while hooked in below another, pass straight through
+                return previous()
+            #looked up every cycle, reset replaces them
+            memory = chip8.memory
+            registers = chip8.registers
+            address = chip8.program_counter
+            opcode = (memory[address] << 8) | memory[address + 1]
+            #an instruction only writes Vx and VF, except the loads of V0 to Vx
+            x = (opcode >> 8) & 0xF
+            loads = opcode & 0xF0FF in (0xF065, 0xF085)
+            before = registers[:x + 1] if loads else registers[x]
+            before_flag = registers[15]
+            previous()
+
+            changed = 0
+            if loads:
+                for index in range(x + 1):
+                    if registers[index] != before[index]:
+                        changed |= 1 << index
+            elif registers[x] != before:
+                changed = 1 << x
+            if registers[15] != before_flag:
+                changed |= 1 << 15
+            register, value = NO_REGISTER, 0
+            if changed:
+                register = (changed & -changed).bit_length() - 1
+                value = registers[register]
+            pack_into(buffer, self.position * record_size,
+                      self.cycle, address, opcode, chip8.I & 0xFFFF, changed, register, value)
+            self.cycle += 1
+            self.position += 1
+            if self.count < self.capacity:
+                self.count += 1
+            if self.position == self.capacity:
+                if self.file is not None:
+                    self.flush()
+                else:
+                    self.position = 0
+
+        install_hook(chip8, 'perform_cycle', perform_cycle)
+        self.hook = perform_cycle
+        self.attached = True
+        return self
+
+    def detach(self):
+        if self.attached:
+            self.attached = False
+            remove_hook(self.chip8, 'perform_cycle', self.hook)
+
+    def __enter__(self):
+        return self.attach()
+
+    def __exit__(self, *exc_info):
+        self.detach()
+
+    def flush(self):
+        """
+        Writes the records in the buffer to the file and empties it
+        """
+        if self.file is None:
+            raise ValueError('Tracer has no file to flush to')
+        self.file.write(memoryview(self.buffer)[:self.count * RECORD.size])
+        self.count = 0
+        self.position = 0
+
+    def close(self):
+        self.detach()
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+
+    def records(self):
+        """
+        The records in the buffer, oldest first, as (cycle, PC, opcode, I, changed, register, value) tuples
+        """
+        first = (self.position - self.count) % self.capacity
+        for index in range(self.count):
+            yield RECORD.unpack_from(self.buffer, ((first + index) % self.capacity) * RECORD.size)
+
+def read_trace(file):
+    """
+    Whether the traced rom had SUPER-CHIP instructions, and an iterator over the records of the trace file,
+    read a buffer at a time
+    """
+    magic, version, record_size, extended = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError('Not a trace file')
+    if version != VERSION or record_size != RECORD.size:
+        raise ValueError('Unsupported trace version %d' % version)
+
+    def records():
+        while True:
+            chunk = file.read(DEFAULT_CAPACITY * RECORD.size)
+            if not chunk:
+                return
+            yield from RECORD.iter_unpack(chunk[:len(chunk) - len(chunk) % RECORD.size])
+    return extended, records()
+
+def format_record(record, extended=False):
+    cycle, address, opcode, I, changed, register, value = record
+    line = '%10d  %03X  %04X  %-18s I=%03X' % (cycle, address, opcode, disassemble(opcode, extended), I)
+    if register != NO_REGISTER:
+        line += '  V%X=%02X' % (register, value)
+        others = changed & ~(1 << register)
+        if others:
+            line += ' (+%s)' % ' '.join('V%X' % index for index in range(16) if (others >> index) & 1)
+    return line
+
+def trace_rom(rom_name, frames, output, input_script=demo_input, seed=0, instructions_per_frame=INSTRUCTIONS_PER_FRAME, quirks=None):
+    chip8 = Chip8(rom_name, seed=seed, quirks=quirks)
+    scheduler = Scheduler(chip8, Interpreter(chip8), instructions_per_frame, turbo=True, skip_idle=False)
+    tracer = Tracer(chip8, file=output).attach()
+    try:
+        for frame in range(frames):
+            set_keys(chip8, input_script(frame))
+            scheduler.run_frame()
+    finally:
+        tracer.close()
+    return tracer.cycle
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record and view binary traces of every instruction a chip 8 rom runs')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help='run a rom with scripted input and trace it')
+    record.add_argument('rom')
+    record.add_argument('--frames', type=int, default=600, help='60HZ frames to run the rom for')
+    record.add_argument('--seed', type=int, default=0)
+    record.add_argument('--quirks', help='quirks profile to run the rom with')
+    record.add_argument('--output', required=True, help='trace file to write')
+    view = commands.add_parser('view', help='print the records of a trace file')
+    view.add_argument('trace')
+    view.add_argument('--start', type=int, default=0, help='first cycle to print')
+    view.add_argument('--count', type=int, help='records to print, all by default')
+    view.add_argument('--pc', type=lambda address: int(address, 16), help='only print records at this address, in hex')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        with open(args.output, 'wb') as output:
+            cycles = trace_rom(args.rom, args.frames, output, seed=args.seed, quirks=args.quirks)
+        print('%s: traced %d instructions to %s' % (args.rom, cycles, args.output))
+        return
+
+    with open(args.trace, 'rb') as trace:
+        extended, records = read_trace(trace)
+        printed = 0
+        for record in records:
+            if record[0] < args.start or (args.pc is not None and record[1] != args.pc):
+                continue
+            if args.count is not None and printed == args.count:
+                break
+            print(format_record(record, extended))
+            printed += 1
+
+if __name__ == '__main__':
+    main()
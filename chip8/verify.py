@@ -0,0 +1,267 @@
+"""
+Runs an engine in lockstep with the reference interpreter and finds the first instruction where they disagree.
+
+ex. python -m chip8.verify roms/* --engine blocks --cycles 200000 --interval 1000
+    python -m chip8.verify roms/INVADERS --engine blocks --replay invaders.log
+
+Both machines start from the same rom, seed and keys. Every interval instructions their states are
+compared by hash, and on a mismatch both are rewound to the last state they agreed on and the instructions
+in between are bisected to the first one after which they differ.
+"""
+import argparse
+import hashlib
+import sys
+from collections import namedtuple
+
+from chip8.chip8 import Chip8
+from chip8.engines import ENGINES, Interpreter, create_engine
+from chip8.headless import demo_input, set_keys
+from chip8.scheduler import INSTRUCTIONS_PER_FRAME
+
+MEMORY_CHUNK_SIZE = 64 #bytes of memory hashed together, a write rehashes only the chunks it touched
+
+#cycle is how many instructions both ran before the first one they disagree after, which starts at address.
+#Engines that run several instructions at once, like blocks, are only told apart where each of their runs ends.
+Divergence = namedtuple('Divergence', ['rom', 'engine', 'cycle', 'frame', 'address', 'opcode', 'differences'])
+
+def digest(*parts):
+    """
+    64 bit hash of parts, XORed together into the incremental hashes
+    """
+    return int.from_bytes(hashlib.blake2b(b''.join(parts), digest_size=8).digest(), 'little')
+
+class IncrementalHash(object):
+    """
+    A hash of a Chip8's memory and display kept up to date by rehashing only what was written.
+
+    The hash is the XOR of a hash per memory chunk and per display row, so a write swaps the old hash
+    of the part it touched for the new one. Memory writes are seen through code_listeners, which
+    _Fx33, _Fx55 and restore already notify, and display writes through dirty_rows, which _Dxyn,
+    _00E0 and the scrolls already set. dirty_rows is cleared every update, so nothing else
+    may present the same machine.
+    """
+    def __init__(self, chip8: Chip8):
+        self.chip8 = chip8
+        self.chunk_hashes = [
+            digest(address.to_bytes(2, 'little'), chip8.memory[address:address + MEMORY_CHUNK_SIZE])
+            for address in range(0, len(chip8.memory), MEMORY_CHUNK_SIZE)
+        ]
+        self.memory_hash = 0
+        for chunk_hash in self.chunk_hashes:
+            self.memory_hash ^= chunk_hash
+        self.dirty_chunks = set()
+        self.row_hashes = []
+        self.display_hash = 0
+        self.rehash_display()
+        chip8.code_listeners.append(self.memory_written)
+
+    def memory_written(self, start, end):
+        self.dirty_chunks.update(range(start // MEMORY_CHUNK_SIZE, (end - 1) // MEMORY_CHUNK_SIZE + 1))
+
+    def rehash_display(self):
+        chip8 = self.chip8
+        self.row_hashes = [digest(row.to_bytes(2, 'little'), chip8.display[row].to_bytes(16, 'little')) for row in range(len(chip8.display))]
+        self.display_hash = len(chip8.display) #the resolution is part of the hash
+        for row_hash in self.row_hashes:
+            self.display_hash ^= row_hash
+        chip8.dirty_rows = 0
+
+    def update(self):
+        """
+        The hash of memory and display, after rehashing the parts written since the last update
+        """
+        chip8 = self.chip8
+        memory = chip8.memory
+        for chunk in self.dirty_chunks:
+            address = chunk * MEMORY_CHUNK_SIZE
+            chunk_hash = digest(address.to_bytes(2, 'little'), memory[address:address + MEMORY_CHUNK_SIZE])
+            self.memory_hash ^= self.chunk_hashes[chunk] ^ chunk_hash
+            self.chunk_hashes[chunk] = chunk_hash
+        self.dirty_chunks.clear()
+
+        if len(chip8.display) != len(self.row_hashes):
+            self.rehash_display()
+        dirty_rows = chip8.dirty_rows
+        chip8.dirty_rows = 0
+        while dirty_rows:
+            row = (dirty_rows & -dirty_rows).bit_length() - 1
+            dirty_rows &= dirty_rows - 1
+            row_hash = digest(row.to_bytes(2, 'little'), chip8.display[row].to_bytes(16, 'little'))
+            self.display_hash ^= self.row_hashes[row] ^ row_hash
+            self.row_hashes[row] = row_hash
+        return self.memory_hash ^ (self.display_hash << 64)
+
+def cpu_state(chip8: Chip8):
+    """
+    Everything but memory and display, small enough to compare whole every time
+    """
+    return (
+        chip8.program_counter, chip8.I, chip8.DT, chip8.ST, chip8.stack_pointer, chip8.draw_flag, bytes(chip8.registers),
+        chip8.stack.tobytes(), bytes(chip8.keys), bytes(chip8.flag_registers),
+        chip8.seed, chip8.random_block, chip8.random_index
+    )
+
+def differences(reference: Chip8, candidate: Chip8):
+    """
+    The parts of candidate's state that differ from reference's, as readable lines
+    """
+    lines = []
+    for name in ('program_counter', 'I', 'DT', 'ST', 'stack_pointer', 'random_index', 'random_block'):
+        if getattr(reference, name) != getattr(candidate, name):
+            lines.append('%s %r != %r' % (name, getattr(reference, name), getattr(candidate, name)))
+    for index in range(16):
+        if reference.registers[index] != candidate.registers[index]:
+            lines.append('V%X %02X != %02X' % (index, reference.registers[index], candidate.registers[index]))
+    if reference.stack.tobytes() != candidate.stack.tobytes():
+        lines.append('stack %s != %s' % (list(reference.stack), list(candidate.stack)))
+    addresses = [address for address in range(len(reference.memory)) if reference.memory[address] != candidate.memory[address]]
+    if addresses:
+        lines.append('memory at %s' % ' '.join('%03X' % address for address in addresses[:16]) + (' ...' if len(addresses) > 16 else ''))
+    if reference.display != candidate.display:
+        rows = [row for row in range(min(len(reference.display), len(candidate.display))) if reference.display[row] != candidate.display[row]]
+        lines.append('display rows %s' % ' '.join(str(row) for row in rows) if rows else 'display resolution')
+    if bytes(reference.flag_registers) != bytes(candidate.flag_registers):
+        lines.append('flag registers')
+    return lines
+
+def run_cycles(chip8: Chip8, engine, cycle, count, input_script, instructions_per_frame):
+    """
+    Runs count instructions starting at cycle, setting the keys at the start of every frame and
+    ticking the timers at its end, so any cycle can be picked up from a snapshot taken there
+    """
+    end = cycle + count
+    while cycle < end:
+        frame, offset = divmod(cycle, instructions_per_frame)
+        if offset == 0:
+            set_keys(chip8, input_script(frame))
+        run = min(instructions_per_frame - offset, end - cycle)
+        engine.run(run)
+        cycle += run
+        if cycle % instructions_per_frame == 0:
+            chip8.update_timers()
+
+class LockstepVerifier(object):
+    """
+    Runs the interpreter and engine on two copies of the same machine, comparing them every interval instructions
+    """
+    def __init__(self, chip8: Chip8, engine, input_script=None, instructions_per_frame=INSTRUCTIONS_PER_FRAME, interval=1000):
+        self.reference = chip8.fork()
+        self.candidate = chip8.fork()
+        self.engine_name = engine
+        self.reference_engine = Interpreter(self.reference)
+        self.candidate_engine = create_engine(engine, self.candidate)
+        self.input_script = input_script or (lambda frame: 0)
+        self.instructions_per_frame = instructions_per_frame
+        self.interval = interval
+        self.reference_hash = IncrementalHash(self.reference)
+        self.candidate_hash = IncrementalHash(self.candidate)
+        self.cycle = 0
+        self.agreed = self.reference.snapshot() #state both were in at agreed_cycle
+        self.agreed_cycle = 0
+
+    def agree(self):
+        return (self.reference_hash.update() == self.candidate_hash.update()
+                and cpu_state(self.reference) == cpu_state(self.candidate))
+
+    def run(self, cycles):
+        """
+        Runs both for cycles instructions, returns the first Divergence or None when they agree throughout
+        """
+        end = self.cycle + cycles
+        while self.cycle < end:
+            count = min(self.interval, end - self.cycle)
+            for chip8, engine in ((self.reference, self.reference_engine), (self.candidate, self.candidate_engine)):
+                run_cycles(chip8, engine, self.cycle, count, self.input_script, self.instructions_per_frame)
+            self.cycle += count
+            if not self.agree() or self.cycle == end and self.reference.snapshot() != self.candidate.snapshot():
+                return self.bisect()
+            self.agreed = self.reference.snapshot()
+            self.agreed_cycle = self.cycle
+        return None
+
+    def run_from_agreed(self, count):
+        for chip8, engine in ((self.reference, self.reference_engine), (self.candidate, self.candidate_engine)):
+            chip8.restore(self.agreed)
+            run_cycles(chip8, engine, self.agreed_cycle, count, self.input_script, self.instructions_per_frame)
+
+    def bisect(self):
+        """
+        Finds the fewest instructions after the last agreement that the two disagree after
+        """
+        low, high = 0, self.cycle - self.agreed_cycle #they agree after low and disagree after high
+        while high - low > 1:
+            middle = (low + high) // 2
+            self.run_from_agreed(middle)
+            if self.reference.snapshot() == self.candidate.snapshot():
+                low = middle
+            else:
+                high = middle
+        self.run_from_agreed(low)
+        address = self.reference.program_counter
+        opcode = (self.reference.memory[address] << 8) | self.reference.memory[(address + 1) % len(self.reference.memory)]
+        self.run_from_agreed(high)
+        cycle = self.agreed_cycle + low
+        return Divergence(
+            self.reference.rom_name, self.engine_name, cycle, cycle // self.instructions_per_frame,
+            address, opcode, differences(self.reference, self.candidate)
+        )
+
+def verify(rom_name, engine='blocks', cycles=100000, input_script=demo_input, seed=0,
+           instructions_per_frame=INSTRUCTIONS_PER_FRAME, interval=1000, quirks=None):
+    """
+    Runs rom_name on engine and the interpreter in lockstep for cycles instructions,
+    returns the first Divergence, or None when the engine matched the interpreter throughout
+    """
+    chip8 = Chip8(rom_name, seed=seed, quirks=quirks)
+    verifier = LockstepVerifier(chip8, engine, input_script, instructions_per_frame, interval)
+    return verifier.run(cycles)
+
+def format_divergence(divergence):
+    lines = ['%s: %s diverges from the interpreter after %d instructions (frame %d), at %03X %04X' % (
+        divergence.rom, divergence.engine, divergence.cycle, divergence.frame, divergence.address, divergence.opcode
+    )]
+    lines.extend('    ' + line for line in divergence.differences)
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check an engine against the interpreter and find the first instruction they disagree on')
+    parser.add_argument('roms', nargs='+', metavar='rom')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='blocks')
+    parser.add_argument('--cycles', type=int, default=100000, help='instructions to run each rom for, the whole log with --replay')
+    parser.add_argument('--interval', type=int, default=1000, help='instructions between state comparisons')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--quirks', help='quirks profile to run the roms with')
+    parser.add_argument('--replay', metavar='FILE', help='input log recorded with main.py --record, single rom only')
+    args = parser.parse_args(argv)
+
+    input_script, seed, instructions_per_frame, cycles, quirks = demo_input, args.seed, INSTRUCTIONS_PER_FRAME, args.cycles, args.quirks
+    if args.replay is not None:
+        if len(args.roms) != 1:
+            parser.error('--replay needs a single rom')
+        if args.quirks is not None:
+            parser.error('--replay runs with the quirks the log was recorded with, leave out --quirks')
+        from chip8.replay import InputReplayer
+        with open(args.replay, 'rb') as log:
+            replayer = InputReplayer(log)
+            masks = list(replayer)
+        input_script = lambda frame: masks[frame] if frame < len(masks) else 0
+        seed, instructions_per_frame, quirks = replayer.seed, replayer.instructions_per_frame, replayer.quirks
+        cycles = len(masks) * instructions_per_frame
+
+    failed = False
+    for rom in args.roms:
+        try:
+            divergence = verify(rom, args.engine, cycles, input_script, seed, instructions_per_frame, args.interval, quirks)
+        except Exception as error:
+            print('%s: failed with %s: %s' % (rom, type(error).__name__, error))
+            failed = True
+            continue
+        if divergence is None:
+            print('%s: %s matches the interpreter for %d instructions' % (rom, args.engine, cycles))
+        else:
+            print(format_divergence(divergence))
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
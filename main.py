@@ -1,31 +1,158 @@
-from chip8.chip8 import Chip8
-from chip8.display import Chip8Display
-from chip8.input import Chip8Input
-from chip8.sound import Chip8Sound
+from chip8.chip8 import Chip8, read_rom
+from chip8.engines import ENGINES, create_engine
+from chip8.quirks import QUIRKS_PROFILES
+from chip8.roms import describe_rom
+from chip8.scheduler import INSTRUCTIONS_PER_FRAME, Scheduler
 
 
-import pygame
+import argparse
+import random
 import sys
-import time
 
-if len(sys.argv) != 2:
-    print("Invalid command!")
-    print("Should be python <Name Of Game>!")
-    exit()
+parser = argparse.ArgumentParser(description='Chip 8 emulator')
+parser.add_argument('roms', nargs='+', metavar='rom', help='path of the rom to run, ex. roms/PONG2')
+parser.add_argument('--engine', choices=sorted(ENGINES), default='interpreter',
+                    help='how instructions are executed, blocks compiles straight-line code into python functions')
+parser.add_argument('--renderer', choices=('rects', 'surface'), default='rects',
+                    help='rects repaints only changed pixels, surface scales a 64x32 pixel buffer to the window in one blit')
+parser.add_argument('--no-grid', dest='grid', action='store_false',
+                    help='draw pixels without the 1px gap between them, surface renderer only')
+parser.add_argument('--quirks', choices=sorted(QUIRKS_PROFILES),
+                    help='interpreter the rom was written for, default from the catalog.json next to the rom or default')
+parser.add_argument('--instructions-per-frame', type=int, default=INSTRUCTIONS_PER_FRAME,
+                    help='instructions run between each 60HZ timer tick, sets how fast the cpu is')
+parser.add_argument('--speed', type=float, default=1.0, help='multiplier of the 60HZ frame rate, ex. 10 for ten times faster')
+parser.add_argument('--turbo', action='store_true', help='run frames as fast as possible without sleeping')
+parser.add_argument('--no-skip-idle', dest='skip_idle', action='store_false',
+                    help='run every instruction of frames spent waiting on a key or the delay timer instead of skipping them')
+parser.add_argument('--seed', type=int, help='seed for the random numbers of the game, random when not given')
+parser.add_argument('--record', metavar='FILE', help='record the keys pressed every frame to FILE for replaying')
+parser.add_argument('--replay', metavar='FILE', help='replay an input log recorded with --record, headless mode only')
+parser.add_argument('--profile', metavar='FILE',
+                    help='time every instruction and write a report to FILE and flame graph stacks to FILE.folded on exit, interpreter engine only')
+parser.add_argument('--trace', metavar='FILE',
+                    help='write a binary trace of every instruction to FILE, view it with python -m chip8.trace view, interpreter engine only')
+parser.add_argument('--headless', action='store_true',
+                    help='run without a window, sound or input and print the speed and final state of each rom')
+parser.add_argument('--cycles', type=int, help='instructions to run each rom for in headless mode')
+parser.add_argument('--frames', type=int, help='60HZ frames to run each rom for in headless mode')
+parser.add_argument('--audio', metavar='FILE', help='render the sound of the rom to a WAV file, headless mode with a single rom only')
+args = parser.parse_args()
+
+if args.headless:
+    for option in ('record', 'profile', 'trace'):
+        if getattr(args, option) is not None:
+            parser.error('--%s only works with a window' % option)
+
+if args.replay is not None:
+    if not args.headless or len(args.roms) != 1:
+        parser.error('--replay needs --headless and a single rom')
+    if args.quirks is not None:
+        parser.error('--replay runs with the quirks the log was recorded with, leave out --quirks')
+    from chip8.headless import format_result
+    from chip8.replay import replay
+
+    with open(args.replay, 'rb') as log:
+        print(format_result(replay(args.roms[0], log, args.engine)))
+    sys.exit(0)
+
+if args.headless:
+    from chip8.headless import format_result, run_headless
+
+    if args.cycles is not None and args.frames is not None:
+        parser.error('--cycles and --frames are mutually exclusive')
+    if args.frames is not None:
+        cycles = args.frames * args.instructions_per_frame
+    elif args.cycles is not None:
+        cycles = args.cycles
+    else:
+        cycles = 100000
+
+    if args.audio is not None and len(args.roms) != 1:
+        parser.error('--audio needs a single rom')
+
+    failed = False
+    for rom in args.roms:
+        try:
+            rom_data = read_rom(rom)
+            quirks = args.quirks or describe_rom(rom, rom_data).quirks
+            print(format_result(run_headless(rom, cycles, args.engine, seed=args.seed,
+                                             instructions_per_frame=args.instructions_per_frame,
+                                             skip_idle=args.skip_idle, quirks=quirks, audio=args.audio, rom_data=rom_data)))
+        except Exception as error:
+            print('%s: failed with %s: %s' % (rom, type(error).__name__, error))
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if len(args.roms) != 1:
+    parser.error('only one rom can be played at a time, use --headless to run several')
+if args.audio is not None:
+    parser.error('--audio only works with --headless')
 
 
+import pygame
+from chip8.display import Chip8Display
+from chip8.input import Chip8Input
+from chip8.sound import SAMPLE_RATE, Chip8Sound
+
+rom_data = read_rom(args.roms[0]) #read once, for both the catalog lookup and the machine
+Rom = describe_rom(args.roms[0], rom_data)
+
+pygame.mixer.pre_init(SAMPLE_RATE, -16, 1, 512) #mono, with a small mixer buffer to keep the sound in step
 pygame.init()
-Display = Chip8Display(pygame)
-Input = Chip8Input(pygame)
+Display = Chip8Display(pygame, args.renderer, args.grid)
+Input = Chip8Input(pygame, Rom.key_map, quantize=args.record is not None, allow_reset=args.record is None)
 Sound = Chip8Sound(pygame)
 
 
-Chip = Chip8(sys.argv[1])
+seed = args.seed if args.seed is not None else random.getrandbits(63)
+Chip = Chip8(args.roms[0], rom_data, seed=seed, quirks=args.quirks or Rom.quirks)
+Engine = create_engine(args.engine, Chip)
+if hasattr(Engine, 'precompile'):
+    from chip8.analysis import analyze_rom
+    Engine.precompile(analyze_rom(Chip.rom_data, Chip.quirks).blocks)
+#profiles and traces only see instructions that run, so none are skipped while either is on
+skip_idle = args.skip_idle and args.profile is None and args.trace is None
+Clock = Scheduler(Chip, Engine, args.instructions_per_frame, args.speed, args.turbo, sleep=Input.wait, skip_idle=skip_idle)
+
+Recorder = None
+if args.record is not None:
+    from chip8.headless import key_mask
+    from chip8.replay import InputRecorder
+    Recorder = InputRecorder(open(args.record, 'wb'), Chip.seed, args.instructions_per_frame, Chip.quirks)
+    #Input quits with sys.exit, flush the last run of keys on the way out
+    import atexit
+    atexit.register(Recorder.close)
+
+present = lambda: Display.draw(Chip)
+if args.profile is not None:
+    if args.engine != 'interpreter':
+        parser.error('--profile only works with the interpreter engine')
+    import atexit
+    from chip8.analysis import analyze_rom
+    from chip8.profiler import Profiler
+    Profile = Profiler(Chip, analyze_rom(Chip.rom_data, Chip.quirks)).attach()
+    present = Profile.wrap_present(present)
+
+    def write_profile():
+        with open(args.profile, 'w') as report:
+            report.write(Profile.report() + '\n')
+        with open(args.profile + '.folded', 'w') as stacks:
+            stacks.write(Profile.collapsed_stacks())
+    atexit.register(write_profile)
+
+if args.trace is not None:
+    if args.engine != 'interpreter':
+        parser.error('--trace only works with the interpreter engine')
+    import atexit
+    from chip8.trace import Tracer
+    Trace = Tracer(Chip, file=open(args.trace, 'wb')).attach()
+    atexit.register(Trace.close)
+
+def before_frame():
+    key_changes = Input.key_changes(Chip, args.instructions_per_frame)
+    if Recorder is not None:
+        Recorder.record(key_mask(Chip))
+    return key_changes
 
-while True:
-    Input.handle_input(Chip)
-    Sound.play(Chip)
-    Chip.perform_cycle()
-    Display.draw(Chip)
-    #emulate 60HZ speed of processor 
-    time.sleep(.0012)
+Clock.run(before_frame=before_frame, after_frame=lambda: Sound.play(Clock.sounding), present=present)
@@ -0,0 +1,48 @@
+"""
+Chip 8 programs for the tests, built from opcodes
+"""
+import random
+
+from chip8.chip8 import Chip8, PROGRAM_START_LOCATION
+
+#every instruction family, with the low bits filled in by random_opcode
+OPCODE_TEMPLATES = (
+    [0x00E0, 0x00EE, 0x1000, 0x2000, 0x3000, 0x4000, 0x5000, 0x6000, 0x7000]
+    + [0x8000 | n for n in (0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0x6, 0x7, 0xE)]
+    + [0x9000, 0xA000, 0xB000, 0xC000, 0xD000, 0xE09E, 0xE0A1]
+    + [0xF000 | n for n in (0x07, 0x0A, 0x15, 0x18, 0x1E, 0x29, 0x33, 0x55, 0x65)]
+)
+
+def program(*opcodes):
+    return b''.join(opcode.to_bytes(2, 'big') for opcode in opcodes)
+
+def random_opcode(rng: random.Random):
+    template = rng.choice(OPCODE_TEMPLATES)
+    family = template & 0xF000
+    if template in (0x00E0, 0x00EE):
+        return template
+    if family in (0x1000, 0x2000, 0xB000):
+        #jumps and calls stay inside the program
+        return template | rng.randrange(PROGRAM_START_LOCATION, PROGRAM_START_LOCATION + 0x200, 2)
+    if family == 0xE000:
+        #keys are read through V0 to V3, which start below 16, so not every key skip faults
+        return template | rng.randrange(4) << 8
+    if family == 0xF000:
+        return template | rng.randrange(16) << 8
+    if family in (0x5000, 0x8000, 0x9000):
+        return template | rng.randrange(0x100) << 4
+    return template | rng.randrange(0x1000)
+
+def random_machine(seed, length=256, **kwargs):
+    """
+    A Chip8 running length random instructions, with random registers and
+    a few return addresses on the stack so not every RET underflows
+    """
+    rng = random.Random(seed)
+    machine = Chip8('random %d' % seed, program(*(random_opcode(rng) for _ in range(length))), seed=seed, **kwargs)
+    for register in range(16):
+        machine.registers[register] = rng.getrandbits(8) if register >= 4 and rng.random() < 0.3 else rng.getrandbits(4)
+    for level in range(8):
+        machine.stack[level] = rng.randrange(PROGRAM_START_LOCATION, PROGRAM_START_LOCATION + 2 * length, 2)
+    machine.stack_pointer = 8
+    return machine
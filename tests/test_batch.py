@@ -0,0 +1,83 @@
+import os
+import unittest
+
+from chip8.chip8 import Chip8, PROGRAM_START_LOCATION
+from chip8.headless import demo_input, set_keys
+from tests.programs import program, random_machine
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+else:
+    from chip8.batch import BatchChip8
+
+ROMS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'roms')
+INSTRUCTIONS_PER_FRAME = 10
+
+def run_lockstep(machines, batch, steps, key_mask):
+    """
+    Runs machines one by one and batch for steps instructions, returns which machines raised
+    """
+    raised = [False] * len(machines)
+    for step in range(steps):
+        if step % INSTRUCTIONS_PER_FRAME == 0:
+            masks = [key_mask(step // INSTRUCTIONS_PER_FRAME, index) for index in range(len(machines))]
+            for machine, mask in zip(machines, masks):
+                set_keys(machine, mask)
+            batch.set_keys(masks)
+        for index, machine in enumerate(machines):
+            if not raised[index]:
+                try:
+                    machine.perform_cycle()
+                except Exception:
+                    raised[index] = True
+        batch.step()
+        if step % INSTRUCTIONS_PER_FRAME == INSTRUCTIONS_PER_FRAME - 1:
+            for machine in machines:
+                machine.update_timers()
+            batch.update_timers()
+    return raised
+
+@unittest.skipIf(numpy is None, 'BatchChip8 needs numpy')
+class BatchChip8Test(unittest.TestCase):
+    def assertMatches(self, machines, batch, raised):
+        for index, machine in enumerate(machines):
+            self.assertEqual(bool(batch.faulted[index]), raised[index], machine.rom_name)
+            if raised[index]:
+                #both stop at the instruction that faulted
+                self.assertEqual(batch.program_counter[index], machine.program_counter, machine.rom_name)
+            else:
+                self.assertEqual(batch.snapshot(index), machine.snapshot(), machine.rom_name)
+
+    def test_roms_match_chip8(self):
+        machines = [
+            Chip8(os.path.join(ROMS, rom), seed=seed, wrap_sprites=seed == 1)
+            for rom in ('INVADERS', 'TETRIS', 'VBRIX', 'MERLIN') for seed in range(2)
+        ]
+        batch = BatchChip8(machines)
+        raised = run_lockstep(machines, batch, 3000, lambda frame, index: demo_input(frame + 7 * index))
+        self.assertMatches(machines, batch, raised)
+
+    def test_random_programs_match_chip8(self):
+        machines = [random_machine(seed, wrap_sprites=seed % 2 == 0) for seed in range(300)]
+        batch = BatchChip8(machines)
+        raised = run_lockstep(machines, batch, 300, lambda frame, index: (index * 37 + frame) & 0xFFFF if frame % 3 else 0)
+        self.assertMatches(machines, batch, raised)
+        self.assertTrue(any(raised) and not all(raised))
+
+    def test_faults_only_the_machines_chip8_raises_on(self):
+        machines = [
+            Chip8('empty stack', program(0x6001, 0x00EE)),
+            Chip8('recursion', program(0x2000 | PROGRAM_START_LOCATION)),
+            Chip8('store', program(0xA000 | 0xFFE, 0xF255)),
+            Chip8('load', program(0xA000 | 0xFFE, 0xF265)),
+            Chip8('loop', program(0x7001, 0x1000 | PROGRAM_START_LOCATION)),
+        ]
+        batch = BatchChip8(machines)
+        raised = run_lockstep(machines, batch, 40, lambda frame, index: 0)
+        self.assertEqual(raised, [True, True, True, True, False])
+        self.assertMatches(machines, batch, raised)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import unittest
+
+from chip8.chip8 import Chip8, PROGRAM_START_LOCATION
+from chip8.engines import create_engine
+from chip8.headless import demo_input, set_keys, state_hashes
+from chip8.scheduler import Scheduler
+from tests.programs import program, random_machine
+
+ROMS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'roms')
+INSTRUCTIONS_PER_FRAME = 14
+
+def run_frames(machine, engine, frames):
+    """
+    The state after every frame as (snapshot, exception type), ending at the first exception
+    """
+    engine = create_engine(engine, machine)
+    states = []
+    for frame in range(frames):
+        set_keys(machine, demo_input(frame))
+        try:
+            engine.run(INSTRUCTIONS_PER_FRAME)
+        except Exception as error:
+            states.append((None, type(error)))
+            break
+        machine.update_timers()
+        states.append((machine.snapshot(), None))
+    return states
+
+class BlockEngineTest(unittest.TestCase):
+    def test_roms_match_interpreter(self):
+        for rom in ('INVADERS', 'TETRIS', 'VBRIX', 'MERLIN'):
+            trails = []
+            for engine in ('interpreter', 'blocks'):
+                machine = Chip8(os.path.join(ROMS, rom), seed=7)
+                scheduler = Scheduler(machine, create_engine(engine, machine), INSTRUCTIONS_PER_FRAME, turbo=True)
+                trail = []
+                for frame in range(600):
+                    set_keys(machine, demo_input(frame))
+                    scheduler.run_frame()
+                    if frame % 50 == 0:
+                        trail.append(state_hashes(machine))
+                trails.append(trail)
+            self.assertEqual(trails[0], trails[1], rom)
+
+    def test_random_programs_match_interpreter(self):
+        for seed in range(200):
+            wrap_sprites = seed % 2 == 0
+            reference = run_frames(random_machine(seed, wrap_sprites=wrap_sprites), 'interpreter', 30)
+            candidate = run_frames(random_machine(seed, wrap_sprites=wrap_sprites), 'blocks', 30)
+            self.assertEqual(reference, candidate, 'random program %d' % seed)
+
+    def assertRaisesOnBoth(self, rom_data, I=0):
+        for engine in ('interpreter', 'blocks'):
+            machine = Chip8('fault', rom_data)
+            machine.I = I
+            with self.assertRaises(IndexError, msg=engine):
+                create_engine(engine, machine).run(100)
+
+    def test_return_with_empty_stack_raises(self):
+        self.assertRaisesOnBoth(program(0x6001, 0x00EE))
+
+    def test_seventeenth_call_raises(self):
+        self.assertRaisesOnBoth(program(0x2000 | PROGRAM_START_LOCATION))
+
+    def test_load_store_past_end_of_memory_raises(self):
+        self.assertRaisesOnBoth(program(0xF255), I=0xFFE)
+        self.assertRaisesOnBoth(program(0xF265), I=0xFFE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+
+from chip8.chip8 import Chip8, PROGRAM_START_LOCATION
+from chip8.trace import Tracer
+from tests.programs import program
+
+class TracerTest(unittest.TestCase):
+    def test_records_after_reset(self):
+        chip8 = Chip8('trace', program(0x6A02, 0x1000 | PROGRAM_START_LOCATION))
+        tracer = Tracer(chip8, capacity=16).attach()
+        chip8.perform_cycle()
+        chip8.reset()
+        chip8.memory[PROGRAM_START_LOCATION + 1] = 0x07
+        chip8.invalidate_code(PROGRAM_START_LOCATION, 2)
+        chip8.perform_cycle()
+        records = list(tracer.records())
+        self.assertEqual([record[2] for record in records], [0x6A02, 0x6A07])
+        self.assertEqual(records[1][4:], (1 << 0xA, 0xA, 0x07))
+
+if __name__ == '__main__':
+    unittest.main()
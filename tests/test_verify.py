@@ -0,0 +1,52 @@
+import os
+import unittest
+from unittest import mock
+
+from chip8.chip8 import Chip8, PROGRAM_START_LOCATION
+from chip8.engines import ENGINES, Interpreter
+from chip8.quirks import QUIRKS_PROFILES
+from chip8.verify import LockstepVerifier, verify
+from tests.programs import program
+
+ROMS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'roms')
+
+class MisaddingEngine(Interpreter):
+    """
+    The interpreter with 7xkk adding one too many
+    """
+    def run(self, cycles):
+        chip8 = self.chip8
+        memory = chip8.memory
+        for _ in range(cycles):
+            address = chip8.program_counter
+            chip8.perform_cycle()
+            if memory[address] >> 4 == 0x7:
+                x = memory[address] & 0xF
+                chip8.registers[x] = (chip8.registers[x] + 1) & 0xFF
+        return cycles
+
+class LockstepVerifierTest(unittest.TestCase):
+    def test_blocks_match_interpreter_on_roms(self):
+        for rom in ('INVADERS', 'TETRIS', 'VBRIX'):
+            for quirks in sorted(QUIRKS_PROFILES):
+                self.assertIsNone(verify(os.path.join(ROMS, rom), 'blocks', 20000, quirks=quirks), (rom, quirks))
+
+    def test_finds_first_divergent_instruction(self):
+        rom_data = program(
+            0x6005, #V0 = 5
+            0x6103, #V1 = 3
+            0x8014, #V0 += V1
+            0x7102, #V1 += 2, misadded
+            0x1000 | PROGRAM_START_LOCATION + 4
+        )
+        with mock.patch.dict(ENGINES, {'misadding': MisaddingEngine}):
+            verifier = LockstepVerifier(Chip8('misadding', rom_data), 'misadding', interval=1000)
+            divergence = verifier.run(5000)
+        self.assertIsNotNone(divergence)
+        self.assertEqual(divergence.cycle, 3)
+        self.assertEqual(divergence.address, PROGRAM_START_LOCATION + 6)
+        self.assertEqual(divergence.opcode, 0x7102)
+        self.assertIn('V1 05 != 06', divergence.differences)
+
+if __name__ == '__main__':
+    unittest.main()